@@ -1,12 +1,68 @@
+import concurrent.futures
+import queue
+import threading
+import time
+
 import requests
-from typing import Generator
+from typing import Callable, Generator, Iterable, Optional
+
+from httpcache import HTTPCache
+from scheduler import RequestScheduler
+from snapshot import OrgSnapshot
+from stats import RequestStats
+
+
+def add_login(username: str) -> Callable[[list[dict]], list[dict]]:
+    """
+    Make OrgSnapshot.update() callback adding user to a member list
+    """
+
+    def func(members: list[dict]) -> list[dict]:
+        if any(m["login"] == username for m in members):
+            return members
+        return members + [{"login": username}]
+
+    return func
+
+
+def remove_login(username: str) -> Callable[[list[dict]], list[dict]]:
+    """
+    Make OrgSnapshot.update() callback removing user from a member list
+    """
+    return lambda members: [m for m in members if m["login"] != username]
 
 
 class CodebergAPI:
-    def __init__(self, owner: str, repo: str, token: str):
+    def __init__(
+        self,
+        owner: str,
+        repo: str,
+        token: str,
+        max_workers: int = 8,
+        readahead: int = 0,
+        cache: Optional[HTTPCache] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        stats: Optional[RequestStats] = None,
+        snapshot: Optional[OrgSnapshot] = None,
+    ):
         self.owner = owner
         self.repo = repo
         self.token = token
+        # maximum number of requests in flight for concurrent fetches
+        self.max_workers = max_workers
+        # number of pages _get_paginated() may fetch ahead of the consumer
+        # (0 disables read-ahead)
+        self.readahead = readahead
+        # optional on-disk cache for GET requests
+        self.cache = cache
+        # throttles and retries all requests
+        if scheduler is None:
+            scheduler = RequestScheduler.from_env(max_concurrency=max_workers)
+        self.scheduler = scheduler
+        # optional per-endpoint instrumentation
+        self.stats = stats
+        # optional persistent snapshot of teams and members
+        self.snapshot = snapshot
 
     def __enter__(self):
         self.session = requests.Session()
@@ -16,13 +72,17 @@ class CodebergAPI:
                 "Content-Type": "application/json",
             }
         )
-        self.session.hooks = {
-            "response": lambda r, *args, **kwargs: r.raise_for_status()
-        }
+        # make sure the connection pool can keep all workers busy
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
         return self
 
     def __exit__(self, exc_type: object, exc_val: object, exc_tb: object) -> None:
         self.session.close()
+        if self.stats is not None:
+            self.stats.close()
+        if self.snapshot is not None:
+            self.snapshot.save()
 
     @property
     def repos_baseurl(self) -> str:
@@ -36,86 +96,270 @@ class CodebergAPI:
     def teams_baseurl(self) -> str:
         return "https://codeberg.org/api/v1/teams"
 
-    def _get_paginated(self, url) -> Generator[None, dict, None]:
-        r = self.session.get(url, params={"limit": 100})
-        yield from r.json()
-        if "next" not in r.links:
+    def _request(
+        self, method: str, url: str, endpoint: str, **kwargs
+    ) -> requests.Response:
+        """
+        Perform a request, endpoint is the URL template used for stats
+        """
+        if self.stats is None:
+            return self.scheduler.request(self.session, method, url, **kwargs)
+
+        retries = 0
+
+        def on_retry() -> None:
+            nonlocal retries
+            retries += 1
+
+        r = None
+        start = time.monotonic()
+        try:
+            r = self.scheduler.request(
+                self.session, method, url, on_retry=on_retry, **kwargs
+            )
+        except requests.HTTPError as e:
+            r = e.response
+            raise
+        finally:
+            sent = received = 0
+            if r is not None:
+                sent = len(r.request.body or b"")
+                received = len(r.content)
+            self.stats.record(
+                method,
+                endpoint,
+                r.status_code if r is not None else None,
+                time.monotonic() - start,
+                sent,
+                received,
+                retries,
+            )
+        return r
+
+    def _get(self, url, endpoint: str, params=None) -> requests.Response:
+        if self.cache is None:
+            return self._request("GET", url, endpoint, params=params)
+
+        url = requests.Request("GET", url, params=params).prepare().url
+        entry = self.cache.get(url)
+        headers = self.cache.conditional_headers(entry) if entry else {}
+        r = self._request("GET", url, endpoint, headers=headers)
+        if r.status_code == 304 and entry is not None:
+            self.cache.touch(url)
+            return self.cache.response(url, entry)
+        self.cache.store(url, r)
+        return r
+
+    def _iter_pages(
+        self, url, endpoint: str
+    ) -> Generator[None, requests.Response, None]:
+        r = self._get(url, endpoint, params={"limit": 100})
+        yield r
+        while "next" in r.links:
+            r = self._get(r.links["next"]["url"], endpoint)
+            yield r
+
+    def _iter_pages_readahead(self, url, endpoint: str) -> Generator[None, list, None]:
+        # Pages are chained via the Link header, so they can't be fetched
+        # concurrently.  Instead, a background thread keeps following
+        # the chain while the consumer is processing earlier pages,
+        # with the queue size bounding the number of buffered pages.
+        pages = queue.Queue(maxsize=self.readahead)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def producer() -> None:
+            try:
+                for r in self._iter_pages(url, endpoint):
+                    if not put(r.json()):
+                        return
+            except Exception as e:
+                put(e)
+                return
+            put(None)
+
+        thread = threading.Thread(target=producer, daemon=True)
+        thread.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is None:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            # stop the producer if the consumer bails out early
+            stop.set()
+            thread.join()
+
+    def _get_paginated(self, url, endpoint: str) -> Generator[None, dict, None]:
+        if self.readahead > 0:
+            for page in self._iter_pages_readahead(url, endpoint):
+                yield from page
+        else:
+            for r in self._iter_pages(url, endpoint):
+                yield from r.json()
+
+    def _snapshotted(
+        self, key: str, fetch: Callable[[], Iterable]
+    ) -> Generator[None, object, None]:
+        """
+        Yield data for key from snapshot if available, otherwise fetch it
+        """
+        if self.snapshot is None:
+            yield from fetch()
             return
-        next_url = r.links["next"]["url"]
-        while True:
-            r = self.session.get(next_url)
-            yield from r.json()
-            if "next" not in r.links:
-                break
-            next_url = r.links["next"]["url"]
-
-    def pulls(self, state="open") -> Generator[None, dict, None]:
+        data = self.snapshot.get(key)
+        if data is None:
+            data = list(fetch())
+            self.snapshot.put(key, data)
+        yield from data
+
+    def pulls(
+        self, state="open", sort: Optional[str] = None
+    ) -> Generator[None, dict, None]:
         """
         state must be one of: open, closed, all
+
+        sort can be one of: oldest, recentupdate, leastupdate,
+        mostcomment, leastcomment, priority
         """
-        return self._get_paginated(f"{self.repos_baseurl}/pulls?state={state}")
+        url = f"{self.repos_baseurl}/pulls?state={state}"
+        if sort is not None:
+            url += f"&sort={sort}"
+        return self._get_paginated(url, "/repos/{owner}/{repo}/pulls")
 
     def set_pr_title(self, pr_id: int, title: str) -> None:
-        self.session.patch(f"{self.repos_baseurl}/pulls/{pr_id}", json={"title": title})
+        self._request(
+            "PATCH",
+            f"{self.repos_baseurl}/pulls/{pr_id}",
+            "/repos/{owner}/{repo}/pulls/{index}",
+            json={"title": title},
+        )
 
     def add_pr_labels(self, pr_id: int, labels: list[int]) -> None:
-        self.session.patch(
-            f"{self.repos_baseurl}/pulls/{pr_id}", json=({"labels": labels})
+        self._request(
+            "PATCH",
+            f"{self.repos_baseurl}/pulls/{pr_id}",
+            "/repos/{owner}/{repo}/pulls/{index}",
+            json=({"labels": labels}),
         )
 
     def labels(self) -> list[dict]:
-        return self.session.get(f"{self.repos_baseurl}/labels").json()
+        return self._get(
+            f"{self.repos_baseurl}/labels", "/repos/{owner}/{repo}/labels"
+        ).json()
 
     def commits(self, pr_id: int) -> list[dict]:
         # https://codeberg.org/api/swagger#/repository/repoGetPullRequestCommits
-        return self.session.get(f"{self.repos_baseurl}/pulls/{pr_id}/commits").json()
+        return self._get(
+            f"{self.repos_baseurl}/pulls/{pr_id}/commits",
+            "/repos/{owner}/{repo}/pulls/{index}/commits",
+        ).json()
+
+    def first_commit(self, pr_id: int) -> Optional[dict]:
+        """
+        Get the first commit of the PR (as listed by commits()), or None
+
+        Skips the verification, file list and stat data, so the cost
+        does not depend on the size of the PR.
+        """
+        # https://codeberg.org/api/swagger#/repository/repoGetPullRequestCommits
+        commits = self._get(
+            f"{self.repos_baseurl}/pulls/{pr_id}/commits",
+            "/repos/{owner}/{repo}/pulls/{index}/commits",
+            params={
+                "limit": 1,
+                "verification": "false",
+                "files": "false",
+                "stat": "false",
+            },
+        ).json()
+        return commits[0] if commits else None
 
     def files(self, pr_id: int) -> list[dict]:
-        return self.session.get(f"{self.repos_baseurl}/pulls/{pr_id}/files").json()
+        return self._get(
+            f"{self.repos_baseurl}/pulls/{pr_id}/files",
+            "/repos/{owner}/{repo}/pulls/{index}/files",
+        ).json()
 
     def get_reviews(self, pr_id: int) -> list[dict]:
-        return self.session.get(f"{self.repos_baseurl}/pulls/{pr_id}/reviews").json()
+        return self._get(
+            f"{self.repos_baseurl}/pulls/{pr_id}/reviews",
+            "/repos/{owner}/{repo}/pulls/{index}/reviews",
+        ).json()
 
     def create_review(self, pr_id: int, comment: str) -> None:
         # Does not appear to be possible to simply post comments
         # https://codeberg.org/api/swagger#/repository/repoCreatePullReview
-        self.session.post(
+        self._request(
+            "POST",
             f"{self.repos_baseurl}/pulls/{pr_id}/reviews",
+            "/repos/{owner}/{repo}/pulls/{index}/reviews",
             json={
                 "body": comment,
             },
         )
 
     def delete_review(self, pr_id: int, review_id: int) -> None:
-        self.session.delete(f"{self.repos_baseurl}/pulls/{pr_id}/reviews/{review_id}")
+        self._request(
+            "DELETE",
+            f"{self.repos_baseurl}/pulls/{pr_id}/reviews/{review_id}",
+            "/repos/{owner}/{repo}/pulls/{index}/reviews/{id}",
+        )
 
     def teams(self, org: str) -> Generator[None, dict, None]:
+        return self._snapshotted(f"org/{org}/teams", lambda: self._fetch_teams(org))
+
+    def _fetch_teams(self, org: str) -> Generator[None, dict, None]:
         # https://codeberg.org/api/swagger#/organization/orgListTeams
         #
         # It *should* support pagination, but apparently it's not
         # providing the Link header to the next page. We do get the
         # X-Total-Count header which lets us work out the number of
-        # pages ourselves.
+        # pages ourselves -- and since we know all the page numbers
+        # upfront, we can fetch them concurrently.
         url = f"{self.orgs_baseurl}/{org}/teams/"
-        params = {"limit": 100, "page": 1}
-        r = self.session.get(url, params=params)
+        limit = 100
+        endpoint = "/orgs/{org}/teams"
+        r = self._get(url, endpoint, params={"limit": limit, "page": 1})
         total = int(r.headers["X-Total-Count"])
         t = r.json()
         yield from t
 
-        count = len(t)
-        while count < total:
-            params["page"] += 1
-            r = self.session.get(url, params=params)
-            t = r.json()
-            yield from t
-            count += len(t)
+        # the server may clamp the limit, so use the actual page size
+        if not t or len(t) >= total:
+            return
+        pages = (total + len(t) - 1) // len(t)
+
+        def get_page(page: int) -> list[dict]:
+            return self._get(
+                url, endpoint, params={"limit": limit, "page": page}
+            ).json()
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(self.max_workers, pages - 1)
+        ) as executor:
+            # map() returns results in submission order
+            for t in executor.map(get_page, range(2, pages + 1)):
+                yield from t
 
     def create_team(self, org: str, name: str, description: str) -> dict:
         # https://codeberg.org/api/swagger#/organization/orgCreateTeam
         # The docs are buggy, see https://codeberg.org/forgejo/forgejo/issues/9881
-        r = self.session.post(
+        r = self._request(
+            "POST",
             f"{self.orgs_baseurl}/{org}/teams",
+            "/orgs/{org}/teams",
             json={
                 "name": name,
                 "description": description,
@@ -148,30 +392,110 @@ class CodebergAPI:
                 "can_create_org_repo": False,
             },
         )
-        return r.json()
+        t = r.json()
+        if self.snapshot is not None:
+            self.snapshot.update(f"org/{org}/teams", lambda d: d + [t])
+            self.snapshot.put(f"team/{t['id']}/members", [])
+            self.snapshot.put(f"team/{t['id']}/repo_count", 0)
+        return t
 
     def team_members(self, team_id: int) -> Generator[None, dict, None]:
-        return self._get_paginated(f"{self.teams_baseurl}/{team_id}/members")
+        return self._snapshotted(
+            f"team/{team_id}/members",
+            lambda: self._get_paginated(
+                f"{self.teams_baseurl}/{team_id}/members", "/teams/{id}/members"
+            ),
+        )
 
     def team_add_member(self, team_id: int, username: str) -> None:
         # https://codeberg.org/api/swagger#/organization/orgAddTeamMember
-        self.session.put(f"{self.teams_baseurl}/{team_id}/members/{username}")
+        self._request(
+            "PUT",
+            f"{self.teams_baseurl}/{team_id}/members/{username}",
+            "/teams/{id}/members/{username}",
+        )
+        if self.snapshot is not None:
+            # adding to a team implicitly adds to the organization,
+            # but we don't know which one, so update all of them
+            for key in self.snapshot.keys():
+                if key.startswith("org/") and key.endswith("/members"):
+                    self.snapshot.update(key, add_login(username))
+            self.snapshot.update(f"team/{team_id}/members", add_login(username))
 
     def team_remove_member(self, team_id: int, username: str) -> None:
         # https://codeberg.org/api/swagger#/organization/orgRemoveTeamMember
-        self.session.delete(f"{self.teams_baseurl}/{team_id}/members/{username}")
+        self._request(
+            "DELETE",
+            f"{self.teams_baseurl}/{team_id}/members/{username}",
+            "/teams/{id}/members/{username}",
+        )
+        if self.snapshot is not None:
+            self.snapshot.update(f"team/{team_id}/members", remove_login(username))
 
     def team_repos(self, team_id: int) -> Generator[None, dict, None]:
         # https://codeberg.org/api/swagger#/organization/orgListTeamRepos
-        return self._get_paginated(f"{self.teams_baseurl}/{team_id}/repos")
+        return self._get_paginated(
+            f"{self.teams_baseurl}/{team_id}/repos", "/teams/{id}/repos"
+        )
+
+    def team_repo_count(self, team_id: int) -> int:
+        if self.snapshot is not None:
+            count = self.snapshot.get(f"team/{team_id}/repo_count")
+            if count is not None:
+                return count
+
+        r = self._get(
+            f"{self.teams_baseurl}/{team_id}/repos",
+            "/teams/{id}/repos",
+            params={"limit": 1},
+        )
+        if "X-Total-Count" in r.headers:
+            count = int(r.headers["X-Total-Count"])
+        else:
+            count = sum(1 for _ in self.team_repos(team_id))
+
+        if self.snapshot is not None:
+            self.snapshot.put(f"team/{team_id}/repo_count", count)
+        return count
 
     def org_members(self, org: str) -> Generator[None, dict, None]:
-        return self._get_paginated(f"{self.orgs_baseurl}/{org}/members")
+        return self._snapshotted(
+            f"org/{org}/members",
+            lambda: self._get_paginated(
+                f"{self.orgs_baseurl}/{org}/members", "/orgs/{org}/members"
+            ),
+        )
 
     def org_delete_team(self, team_id: int) -> None:
         # https://codeberg.org/api/swagger#/organization/orgDeleteTeam
-        self.session.delete(f"{self.teams_baseurl}/{team_id}")
+        self._request("DELETE", f"{self.teams_baseurl}/{team_id}", "/teams/{id}")
+        if self.snapshot is not None:
+            for key in self.snapshot.keys():
+                if key.startswith("org/") and key.endswith("/teams"):
+                    self.snapshot.update(
+                        key, lambda d: [t for t in d if t["id"] != team_id]
+                    )
+            self.snapshot.discard(f"team/{team_id}/members")
+            self.snapshot.discard(f"team/{team_id}/repo_count")
 
     def org_remove_member(self, org: str, username: str) -> None:
         # https://codeberg.org/api/swagger#/organization/orgDeleteMember
-        self.session.delete(f"{self.orgs_baseurl}/{org}/members/{username}")
+        self._request(
+            "DELETE",
+            f"{self.orgs_baseurl}/{org}/members/{username}",
+            "/orgs/{org}/members/{username}",
+        )
+        if self.snapshot is not None:
+            self.snapshot.update(f"org/{org}/members", remove_login(username))
+            # removing from the organization removes from all its teams
+            teams = self.snapshot.get(f"org/{org}/teams")
+            if teams is not None:
+                keys = [f"team/{t['id']}/members" for t in teams]
+            else:
+                keys = [
+                    key
+                    for key in self.snapshot.keys()
+                    if key.startswith("team/") and key.endswith("/members")
+                ]
+            for key in keys:
+                self.snapshot.update(key, remove_login(username))
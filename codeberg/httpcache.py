@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import os.path
+import tempfile
+import time
+
+import requests
+import requests.structures
+from typing import Optional
+
+# headers that are replayed from cache along with the body
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link", "X-Total-Count")
+
+
+class HTTPCache:
+    """
+    On-disk cache of GET responses, revalidated via conditional requests
+
+    Entries are keyed by the full request URL (including parameters)
+    and stored only if the server provides an ETag or Last-Modified
+    validator.  Entries older than max_age seconds are dropped,
+    and the least recently used ones are evicted when the cache grows
+    beyond max_size bytes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_age: float = 30 * 24 * 3600,
+        max_size: int = 256 * 1024 * 1024,
+    ):
+        self.path = path
+        self.max_age = max_age
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+        self.prune()
+
+    @classmethod
+    def from_env(cls) -> Optional["HTTPCache"]:
+        """
+        Create a cache if CODEBERG_CACHE_DIR is set, None otherwise
+        """
+        path = os.environ.get("CODEBERG_CACHE_DIR")
+        if not path:
+            return None
+        return cls(os.path.expanduser(path))
+
+    def _entry_path(self, url: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(url.encode()).hexdigest())
+
+    def get(self, url: str) -> Optional[dict]:
+        try:
+            with open(self._entry_path(url)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # guard against hash collisions
+        if entry["url"] != url:
+            return None
+        return entry
+
+    def conditional_headers(self, entry: dict) -> dict:
+        headers = {}
+        if "ETag" in entry["headers"]:
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if "Last-Modified" in entry["headers"]:
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    def store(self, url: str, r: requests.Response) -> None:
+        if "ETag" not in r.headers and "Last-Modified" not in r.headers:
+            return
+        entry = {
+            "url": url,
+            "headers": {k: r.headers[k] for k in STORED_HEADERS if k in r.headers},
+            "body": r.text,
+        }
+        # write atomically, other threads may be reading the same entry
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._entry_path(url))
+
+    def touch(self, url: str) -> None:
+        # mark the entry as used (for LRU eviction) and revalidated
+        try:
+            os.utime(self._entry_path(url))
+        except OSError:
+            pass
+
+    def response(self, url: str, entry: dict) -> requests.Response:
+        """
+        Build a Response object replaying a cached entry
+        """
+        r = requests.Response()
+        r.status_code = 200
+        r.url = url
+        r.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+        r.encoding = "utf-8"
+        r._content = entry["body"].encode()
+        return r
+
+    def prune(self) -> None:
+        now = time.time()
+        entries = []
+        for de in os.scandir(self.path):
+            st = de.stat()
+            if now - st.st_mtime > self.max_age:
+                os.unlink(de.path)
+            else:
+                entries.append((st.st_mtime, st.st_size, de.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.unlink(path)
+            total -= size
@@ -0,0 +1,89 @@
+import json
+import sqlite3
+
+from typing import Optional
+
+
+class MaintsDB:
+    """
+    SQLite store mapping e-mail addresses to Codeberg logins
+
+    Lookups by e-mail and by login are indexed.  Changes are committed
+    in batches of batch_size, and on leaving the context (even if due
+    to an exception), so an interrupted run loses no more than the last
+    batch.
+    """
+
+    def __init__(self, path: str, batch_size: int = 20):
+        self.batch_size = batch_size
+        self._pending = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS maints "
+            "(email TEXT PRIMARY KEY, login TEXT NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS maints_login ON maints (login)")
+        self.db.commit()
+
+    def __enter__(self) -> "MaintsDB":
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM maints").fetchone()[0]
+
+    def import_json(self, path: str) -> None:
+        """
+        Import mapping from JSON file at path, if it exists
+        """
+        try:
+            with open(path) as f:
+                maints = json.load(f)
+        except (OSError, IOError):
+            return
+        self.db.executemany(
+            "INSERT OR REPLACE INTO maints (email, login) VALUES (?, ?)",
+            maints.items(),
+        )
+        self.db.commit()
+
+    def export_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def as_dict(self) -> dict[str, str]:
+        return dict(self.db.execute("SELECT email, login FROM maints ORDER BY rowid"))
+
+    def get(self, email: str) -> Optional[str]:
+        row = self.db.execute(
+            "SELECT login FROM maints WHERE email = ?", (email,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def has_login(self, login: str) -> bool:
+        return (
+            self.db.execute(
+                "SELECT 1 FROM maints WHERE login = ? LIMIT 1", (login,)
+            ).fetchone()
+            is not None
+        )
+
+    def set(self, email: str, login: str) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO maints (email, login) VALUES (?, ?)",
+            (email, login),
+        )
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.commit()
+
+    def commit(self) -> None:
+        self.db.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.db.close()
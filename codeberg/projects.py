@@ -0,0 +1,48 @@
+import hashlib
+import json
+
+from typing import Optional
+
+
+class ProjectIndex:
+    """
+    Projects loaded from projects-index.json (see ../projects2index.py)
+
+    Every project is a dict with email, name, url, description,
+    aliases, members, subprojects and all_members keys.  all_members
+    are the (lowercase) e-mails of all project members, including
+    members inherited from subprojects.
+    """
+
+    def __init__(self, path: str):
+        with open(path) as f:
+            data = json.load(f)
+        self.projects = data["projects"]
+        self.aliases = data["aliases"]
+        self.member_projects = data["member_projects"]
+
+    def __iter__(self):
+        return iter(self.projects.values())
+
+    def lookup(self, team_name: str) -> Optional[dict]:
+        """
+        Find the project matching team name (case-insensitively)
+        """
+        email = self.aliases.get(team_name.lower())
+        if email is None:
+            return None
+        return self.projects[email]
+
+
+def fingerprint(members: list[str], description: str, devs: dict) -> str:
+    """
+    Hash of everything that affects syncing a project to a team
+    """
+    data = {
+        "members": sorted(members),
+        "description": description,
+        "logins": {m: devs.get(m, "") for m in members},
+        # removals depend only on which logins belong to developers
+        "developers": sorted(set(devs.values())),
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
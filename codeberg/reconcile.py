@@ -0,0 +1,79 @@
+import concurrent.futures
+
+from typing import Callable, Iterable, Optional
+
+
+class Reconciliation:
+    """
+    Changes needed to bring the developers team and the organization
+    in sync with the developer list
+
+    desired maps logins to all e-mail addresses of the developer
+    (devs maps every address to a login, so one developer may have
+    multiple addresses).  Developers missing from the team are invited,
+    organization members that are not developers are removed.
+    """
+
+    def __init__(
+        self,
+        devs: dict[str, str],
+        team_members: Iterable[str],
+        org_members: Iterable[str],
+    ):
+        self.desired: dict[str, list[str]] = {}
+        for email, login in sorted(devs.items()):
+            if login:
+                self.desired.setdefault(login, []).append(email)
+        self.to_invite = sorted(set(self.desired) - set(team_members))
+        self.to_remove = sorted(set(org_members) - set(self.desired))
+
+    def actions(self) -> list[tuple[str, str]]:
+        return [("INVITE", login) for login in self.to_invite] + [
+            ("REMOVE", login) for login in self.to_remove
+        ]
+
+    def describe(self, op: str, login: str) -> str:
+        if op == "INVITE":
+            return f"{op} {login} ({', '.join(self.desired[login])})"
+        return f"{op} {login}"
+
+    def apply(
+        self,
+        invite: Callable[[str], None],
+        remove: Callable[[str], None],
+        jobs: int,
+    ) -> int:
+        """
+        Apply the changes using jobs workers
+
+        Failed actions are not retried here, since the request
+        scheduler already retries transient errors.
+
+        Prints the actions in order, followed by a summary.  Returns
+        the number of actions that failed.
+        """
+        handlers = {"INVITE": invite, "REMOVE": remove}
+
+        def run(action: tuple[str, str]) -> Optional[Exception]:
+            op, login = action
+            try:
+                handlers[op](login)
+            except Exception as e:
+                return e
+            return None
+
+        actions = self.actions()
+        failed = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            # map() returns results in order, so output is deterministic
+            for action, err in zip(actions, executor.map(run, actions)):
+                print(self.describe(*action))
+                if err is not None:
+                    print(f"ERROR: {err}")
+                    failed += 1
+
+        print(
+            f"{len(self.to_invite)} to invite, {len(self.to_remove)} to remove, "
+            f"{failed} failed"
+        )
+        return failed
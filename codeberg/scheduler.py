@@ -0,0 +1,198 @@
+import email.utils
+import os
+import random
+import threading
+import time
+
+import requests
+from typing import Callable, Optional
+
+# methods that can be safely repeated if the server failed midway
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+# statuses indicating a transient server-side problem
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+# statuses indicating that we should slow down
+THROTTLE_STATUSES = frozenset((429, 503))
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """
+    Parse Retry-After header value into the number of seconds to wait
+    """
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RequestScheduler:
+    """
+    Throttle, retry and adaptively parallelize HTTP requests
+
+    If rate is set, requests are admitted through a token bucket allowing
+    rate requests per second (with bursts of up to burst requests).
+    Requests are also admitted through a concurrency limit that is
+    halved whenever the server signals overload and slowly regrown on
+    successful responses (AIMD).
+    Retry-After and rate limit headers pause all requests until
+    the server is ready to accept them again.
+
+    Failed requests are retried with jittered exponential backoff.
+    Transient server errors are retried only for idempotent methods,
+    429 is retried for all methods since the request was not processed.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: int = 10,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+
+    @classmethod
+    def from_env(cls, max_concurrency: int = 8) -> "RequestScheduler":
+        """
+        Create a scheduler throttled to CODEBERG_RATE requests per second
+        (with bursts of CODEBERG_BURST), or unthrottled if it is not set
+        """
+        rate = os.environ.get("CODEBERG_RATE")
+        return cls(
+            rate=float(rate) if rate else None,
+            burst=int(os.environ.get("CODEBERG_BURST", 10)),
+            max_concurrency=max_concurrency,
+        )
+
+    def _acquire(self) -> None:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self.rate is not None:
+                    self._tokens = min(
+                        self.burst,
+                        self._tokens + (now - self._last_refill) * self.rate,
+                    )
+                self._last_refill = now
+
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self._in_flight >= int(self._limit):
+                    delay = None
+                elif self.rate is not None and self._tokens < 1:
+                    delay = (1 - self._tokens) / self.rate
+                else:
+                    if self.rate is not None:
+                        self._tokens -= 1
+                    self._in_flight += 1
+                    return
+                self._cond.wait(delay)
+
+    def _release(self, throttled: bool) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self._limit = max(1.0, self._limit / 2)
+            else:
+                self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+    def _pause(self, seconds: float) -> None:
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _server_delay(self, r: requests.Response) -> Optional[float]:
+        """
+        Get the delay requested by the server, if any
+        """
+        if "Retry-After" in r.headers:
+            return parse_retry_after(r.headers["Retry-After"])
+        for prefix in ("X-RateLimit-", "RateLimit-"):
+            remaining = r.headers.get(prefix + "Remaining")
+            reset = r.headers.get(prefix + "Reset")
+            if remaining is None or reset is None:
+                continue
+            try:
+                if int(remaining) > 0:
+                    return None
+                reset = float(reset)
+            except ValueError:
+                return None
+            # X-RateLimit-Reset is an epoch timestamp, RateLimit-Reset
+            # is relative
+            if prefix == "X-RateLimit-":
+                reset -= time.time()
+            return max(0.0, reset)
+        return None
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def request(
+        self,
+        session: requests.Session,
+        method: str,
+        url: str,
+        on_retry: Optional[Callable[[], None]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        method = method.upper()
+        attempt = 0
+        while True:
+            self._acquire()
+            r = None
+            try:
+                r = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if method not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                    raise
+            finally:
+                # release the slot whatever the request raised
+                self._release(
+                    throttled=r is not None and r.status_code in THROTTLE_STATUSES
+                )
+
+            if r is None:
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                if on_retry is not None:
+                    on_retry()
+                continue
+
+            server_delay = self._server_delay(r)
+            if server_delay is not None:
+                self._pause(server_delay)
+
+            retryable = r.status_code == 429 or (
+                r.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+            )
+            if not retryable or attempt >= self.max_retries:
+                r.raise_for_status()
+                return r
+
+            delay = self._backoff(attempt)
+            if server_delay is not None:
+                delay = max(delay, server_delay)
+            time.sleep(delay)
+            attempt += 1
+            if on_retry is not None:
+                on_retry()
@@ -0,0 +1,83 @@
+import json
+import os
+import os.path
+import tempfile
+import threading
+import time
+
+from typing import Callable, Optional
+
+
+class OrgSnapshot:
+    """
+    Persistent snapshot of remote organization state
+
+    Stores lists of teams, team members and org members, and team
+    repository counts, each with the time it was fetched.  Entries
+    older than max_age seconds are ignored, so that the data is fetched
+    again.  Changes made through CodebergAPI are applied to the snapshot
+    in place, so it stays valid for subsequent readers.
+
+    Keys are strings such as "org/gentoo/teams", "org/gentoo/members",
+    "team/123/members" and "team/123/repo_count".
+    """
+
+    def __init__(self, path: str, max_age: float = 3600):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, IOError, ValueError):
+            self.entries = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["OrgSnapshot"]:
+        """
+        Use snapshot from CODEBERG_SNAPSHOT if set, None otherwise
+
+        The maximum age (in seconds) can be set via
+        CODEBERG_SNAPSHOT_MAX_AGE.
+        """
+        path = os.environ.get("CODEBERG_SNAPSHOT")
+        if not path:
+            return None
+        max_age = float(os.environ.get("CODEBERG_SNAPSHOT_MAX_AGE", 3600))
+        return cls(os.path.expanduser(path), max_age)
+
+    def get(self, key: str) -> Optional[object]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry["time"] > self.max_age:
+                return None
+            return entry["data"]
+
+    def put(self, key: str, data: object) -> None:
+        with self._lock:
+            self.entries[key] = {"time": time.time(), "data": data}
+
+    def update(self, key: str, func: Callable[[object], object]) -> None:
+        """
+        Replace the data for key with func(data), if key is present
+        """
+        with self._lock:
+            if key in self.entries:
+                self.entries[key]["data"] = func(self.entries[key]["data"])
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self.entries.pop(key, None)
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            return list(self.entries)
+
+    def save(self) -> None:
+        with self._lock:
+            fd, tmp = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(self.path)), prefix=".tmp"
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp, self.path)
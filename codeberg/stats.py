@@ -0,0 +1,123 @@
+import bisect
+import json
+import os
+import threading
+
+from typing import Callable, Optional
+
+# upper bounds (in seconds) of latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class EndpointStats:
+    __slots__ = (
+        "calls",
+        "errors",
+        "retries",
+        "bytes_sent",
+        "bytes_received",
+        "total_time",
+        "histogram",
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_time = 0.0
+        # the last bucket collects everything above LATENCY_BUCKETS[-1]
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "total_time": round(self.total_time, 3),
+            "mean_time": round(self.total_time / self.calls, 3) if self.calls else 0,
+            "latency_histogram": {
+                **{
+                    f"<={bound}": count
+                    for bound, count in zip(LATENCY_BUCKETS, self.histogram)
+                },
+                f">{LATENCY_BUCKETS[-1]}": self.histogram[-1],
+            },
+        }
+
+
+class RequestStats:
+    """
+    Per-endpoint request counters and latency histograms
+
+    Requests are grouped by method and endpoint template, e.g.
+    "GET /teams/{id}/members".  The collected data is written as JSON
+    to path on close(), and every request is additionally passed
+    to the on_request callback.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        on_request: Optional[Callable[[dict], None]] = None,
+    ):
+        self.path = path
+        self.on_request = on_request
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["RequestStats"]:
+        """
+        Create stats dumped to CODEBERG_STATS if set, None otherwise
+        """
+        path = os.environ.get("CODEBERG_STATS")
+        if not path:
+            return None
+        return cls(path)
+
+    def record(
+        self,
+        method: str,
+        endpoint: str,
+        status: Optional[int],
+        elapsed: float,
+        bytes_sent: int,
+        bytes_received: int,
+        retries: int,
+    ) -> None:
+        key = f"{method} {endpoint}"
+        with self._lock:
+            s = self.endpoints.setdefault(key, EndpointStats())
+            s.calls += 1
+            if status is None or status >= 400:
+                s.errors += 1
+            s.retries += retries
+            s.bytes_sent += bytes_sent
+            s.bytes_received += bytes_received
+            s.total_time += elapsed
+            s.histogram[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+        if self.on_request is not None:
+            self.on_request(
+                {
+                    "endpoint": key,
+                    "status": status,
+                    "elapsed": elapsed,
+                    "bytes_sent": bytes_sent,
+                    "bytes_received": bytes_received,
+                    "retries": retries,
+                }
+            )
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {k: v.as_dict() for k, v in sorted(self.endpoints.items())}
+
+    def close(self) -> None:
+        if self.path is not None:
+            with open(self.path, "w") as f:
+                json.dump(self.as_dict(), f, indent=2)
@@ -3,25 +3,47 @@
 # Sync developers team on Codeberg (invite or remove)
 # 2-clause BSD licensed
 
+import argparse
 import json
 import os
 import os.path
 import sys
 
 from codebergapi import CodebergAPI
-
+from httpcache import HTTPCache
+from reconcile import Reconciliation
+from snapshot import OrgSnapshot
+from stats import RequestStats
 
 ORG = "gentoo"
 
 
-def main(devs_json="devs.json"):
-    with open(devs_json) as devs_f:
+def main(argv):
+    argp = argparse.ArgumentParser(prog=argv[0])
+    argp.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        help="Number of invitations and removals to apply concurrently",
+    )
+    argp.add_argument("devs_json", nargs="?", default="devs.json")
+    args = argp.parse_args(argv[1:])
+
+    with open(args.devs_json) as devs_f:
         devs = json.load(devs_f)
 
     with open(os.path.expanduser("~/.codeberg-token")) as f:
         api_token = f.read().strip()
 
-    with CodebergAPI("gentoo", "gentoo", api_token) as cb:
+    with CodebergAPI(
+        "gentoo",
+        "gentoo",
+        api_token,
+        cache=HTTPCache.from_env(),
+        stats=RequestStats.from_env(),
+        snapshot=OrgSnapshot.from_env(),
+    ) as cb:
         for t in cb.teams(ORG):
             if t["name"] == "developers":
                 break
@@ -29,24 +51,19 @@ def main(devs_json="devs.json"):
             raise RuntimeError("Unable to find developers team")
 
         team_id = t["id"]
-        members = frozenset(m["login"] for m in cb.team_members(team_id))
-        remaining = set(m["login"] for m in cb.org_members(ORG))
-        revmap = dict((v, k) for k, v in devs.items())
-
-        for cbdev, dev in revmap.items():
-            if not cbdev:
-                continue
-            if cbdev in members:
-                remaining.discard(cbdev)
-            else:
-                print(f"INVITE {cbdev} ({dev})")
-                cb.team_add_member(team_id, cbdev)
-        for m in remaining:
-            print(f"REMOVE {m}")
-            cb.org_remove_member(ORG, m)
+        rec = Reconciliation(
+            devs,
+            (m["login"] for m in cb.team_members(team_id)),
+            (m["login"] for m in cb.org_members(ORG)),
+        )
+        failed = rec.apply(
+            lambda login: cb.team_add_member(team_id, login),
+            lambda login: cb.org_remove_member(ORG, login),
+            args.jobs,
+        )
 
-    return 0
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
-    sys.exit(main(*sys.argv[1:]))
+    sys.exit(main(sys.argv))
@@ -3,119 +3,75 @@
 # Sync projects to Codeberg
 # 2-clause BSD licensed
 
+import argparse
+import concurrent.futures
 import json
 import os.path
+import random
 import sys
+import traceback
 
-import lxml.etree
 from codebergapi import CodebergAPI
+from httpcache import HTTPCache
+from projects import ProjectIndex, fingerprint
+from snapshot import OrgSnapshot
+from stats import RequestStats
+from syncplan import Plan
 
 
 ORG = "gentoo"
 
 
-def add_members(members, p, xmltree):
-    members += [m.findtext("email").lower() for m in p.findall("member")]
+def plan_team(plan, cb, t, p, members, team_members, devs, cb_devs) -> None:
+    team_id = t["id"]
+    team_name = t["name"]
+    print(f"{team_name} <-> {p['email']}")
 
-    for subp in p.findall("subproject"):
-        if subp.get("inherit-members") == "1":
-            subp_email = subp.get("ref")
-            for op in xmltree:
-                if op.findtext("email") == subp_email:
-                    add_members(members, op, xmltree)
+    # all project members mapped to codeberg logins
+    cb_members = set(devs[x] for x in members if devs.get(x))
 
+    # Codeberg members that are not project members
+    extra_cb_members = team_members - cb_members
 
-def main(devs_json="devs.json", projects_xml="projects.xml"):
-    with open(devs_json) as devs_f:
-        devs = json.load(devs_f)
+    # remove extraneous gh team members that do have dev acct
+    # (i.e. most likely left the team)
+    for m in sorted(extra_cb_members):
+        if m in cb_devs:
+            plan.add("remove", team_name, team_id=team_id, user=m)
+            team_members.discard(m)
 
-    with open(os.path.expanduser("~/.codeberg-token")) as f:
-        api_token = f.read().strip()
+    # Project members not listed in team
+    extra_devs = cb_members - team_members
+    for m in sorted(extra_devs):
+        plan.add("add", team_name, team_id=team_id, user=m)
+        team_members.add(m)
 
-    projs_x = lxml.etree.parse(projects_xml)
-    projs = {}
-    for p in projs_x.getroot():
-        projs[p.findtext("email").split("@")[0].lower()] = p
-        projs[p.findtext("name").split("@")[0].replace(" ", "-").lower()] = p
-        projs[p.findtext("url").split(":")[2].replace(" ", "-").lower()] = p
+    # empty now? remove it
+    if not team_members:
+        if cb.team_repo_count(team_id):
+            print("EMPTY TEAM WITH REPOS")
+        else:
+            print(f"OBSOLETE TEAM https://codeberg.org/org/{ORG}/teams/{team_name}")
 
-    cb_devs = set(devs.values())
-    rem_projs = set(p for p in projs_x.getroot())
-
-    with CodebergAPI("gentoo", "gentoo", api_token) as cb:
-        teams_to_delete = []
-        for t in cb.teams(ORG):
-            team_id = t["id"]
-            team_name = t["name"]
-            if team_name.lower() in ("owners", "developers", "mirror-bot"):
-                # skip teams that shouldn't be treated as projects
-                # 'Owners' is special on Codeberg
-                # See https://docs.codeberg.org/collaborating/create-organization/#access-rights
-                continue
-            p = projs.get(team_name.lower())
-            if p is None:
-                print(f"{team_name} <-> ?")
-                teams_to_delete.append((team_id, team_name))
-                continue
-            print(f"{team_name} <-> {p}")
-            rem_projs.remove(p)
-            members = []
-            add_members(members, p, projs_x.getroot())
-
-            # all project members mapped to codeberg logins
-            cb_members = set(devs[x] for x in members if devs.get(x))
-            # all team members as listed in Codeberg
-            team_members = set(u["login"] for u in cb.team_members(team_id))
-
-            # Codeberg members that are not project members
-            extra_cb_members = team_members - cb_members
-
-            # remove extraneous gh team members that do have dev acct
-            # (i.e. most likely left the team)
-            for m in extra_cb_members:
-                if m in cb_devs:
-                    print(f"REMOVE {m}")
-                    cb.team_remove_member(team_id, m)
-                    team_members.discard(m)
-
-            # Project members not listed in team
-            extra_devs = cb_members - team_members
-            for m in extra_devs:
-                print(f"ADD {m}")
-                cb.team_add_member(team_id, m)
-                team_members.add(m)
-
-            # empty now? remove it
-            if not team_members:
-                if next(cb.team_repos(team_id), None):
-                    print("EMPTY TEAM WITH REPOS")
-                else:
-                    print(
-                        f"OBSOLETE TEAM https://codeberg.org/org/{ORG}/teams/{team_name}"
-                    )
-
-        for (team_id, team_name) in teams_to_delete:
-            print(f"DELETE team {team_name}")
-            cb.org_delete_team(team_id)
 
+def plan_new_teams(plan, rem_projs, devs) -> None:
     for p in rem_projs:
         names = [
-            p.findtext("email").split("@")[0],
-            p.findtext("name").replace(" ", "-").lower(),
-            p.findtext("name").replace(" ", "-"),
-            p.findtext("url").split(":")[2].replace(" ", "-").lower(),
-            p.findtext("url").split(":")[2].replace(" ", "-"),
+            p["email"].split("@")[0],
+            p["name"].replace(" ", "-").lower(),
+            p["name"].replace(" ", "-"),
+            p["url"].split(":")[2].replace(" ", "-").lower(),
+            p["url"].split(":")[2].replace(" ", "-"),
         ]
         seen = {}
         names = [seen.setdefault(x, x) for x in names if x not in seen]
-        desc = p.findtext("description")
+        desc = p["description"]
         if len(desc) >= 255:
             desc = desc[:254] + "…"
-        members = []
-        add_members(members, p, projs_x.getroot())
+        members = p["all_members"]
 
         if not members:
-            if not p.findall("subproject"):
+            if not p["subprojects"]:
                 print(f"WARN: {names[0]} project has no developers!")
             else:
                 print(f"NOTE: {names[0]} project purely organizational (no members)")
@@ -145,15 +101,201 @@ def main(devs_json="devs.json", projects_xml="projects.xml"):
             resp = "1"
         name = names[int(resp) - 1]
 
-        print(f"CREATE TEAM {name}")
-        t = cb.create_team(ORG, name, desc)
+        plan.add("create_team", name, description=desc, members=cb_members)
+
+
+def make_plan(cb, args, fingerprints: dict) -> tuple[Plan, int]:
+    """
+    Read the current state and compute the changes needed
+
+    fingerprints maps team ids to fingerprints of the projects they
+    were last synced to.  Teams whose fingerprint did not change
+    are skipped (unless randomly sampled for drift detection),
+    and fingerprints is updated to the current values.
+
+    If reading a team fails, the error is reported and the team is left
+    out of the plan and of fingerprints, so that it is synced next time.
+    Returns the plan and the number of teams that could not be read.
+    """
+    with open(args.devs_json) as devs_f:
+        devs = json.load(devs_f)
+
+    projs = ProjectIndex(args.projects_index)
+
+    cb_devs = set(devs.values())
+    rem_projs = dict((p["email"], p) for p in projs)
+
+    plan = Plan()
+    teams_to_delete = []
+    teams_to_sync = []
+    for t in cb.teams(ORG):
         team_id = t["id"]
-        for m in cb_members:
-            print(f"ADD {m}")
-            cb.team_add_member(team_id, m)
+        team_name = t["name"]
+        if team_name.lower() in ("owners", "developers", "mirror-bot"):
+            # skip teams that shouldn't be treated as projects
+            # 'Owners' is special on Codeberg
+            # See https://docs.codeberg.org/collaborating/create-organization/#access-rights
+            continue
+        p = projs.lookup(team_name)
+        if p is None:
+            print(f"{team_name} <-> ?")
+            teams_to_delete.append((team_id, team_name))
+            continue
+        del rem_projs[p["email"]]
+
+        members = p["all_members"]
+        fp = fingerprint(members, p["description"], devs)
+        old_fp = fingerprints.get(str(team_id))
+        fingerprints[str(team_id)] = fp
+        if not args.full and fp == old_fp and random.random() >= args.sample:
+            continue
+        teams_to_sync.append((t, p, members))
+
+    def read_team_members(t: dict) -> set[str]:
+        return set(u["login"] for u in cb.team_members(t["id"]))
+
+    # fetch all team member lists in parallel
+    failed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        all_team_members = [
+            executor.submit(read_team_members, t) for t, p, members in teams_to_sync
+        ]
+        for (t, p, members), f in zip(teams_to_sync, all_team_members):
+            # plan every team separately, so that a failure does not
+            # leave a partial plan for it
+            team_plan = Plan()
+            try:
+                plan_team(team_plan, cb, t, p, members, f.result(), devs, cb_devs)
+            except Exception:
+                print(f"ERROR: reading team {t['name']} failed")
+                traceback.print_exc(file=sys.stdout)
+                del fingerprints[str(t["id"])]
+                failed += 1
+                continue
+            plan.actions.extend(team_plan.actions)
+
+    for (team_id, team_name) in teams_to_delete:
+        plan.add("delete_team", team_name, team_id=team_id)
+
+    plan_new_teams(plan, rem_projs.values(), devs)
+    return plan, failed
+
+
+def main(argv):
+    argp = argparse.ArgumentParser(prog=argv[0])
+    argp.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        help="Number of teams to read or update concurrently",
+    )
+    plan_group = argp.add_mutually_exclusive_group()
+    plan_group.add_argument(
+        "--save-plan",
+        metavar="PLAN_JSON",
+        help="Only compute the changes and save them to PLAN_JSON",
+    )
+    plan_group.add_argument(
+        "--apply-plan",
+        metavar="PLAN_JSON",
+        help="Apply changes from PLAN_JSON instead of computing them",
+    )
+    argp.add_argument(
+        "--state",
+        metavar="STATE_JSON",
+        help="Store project fingerprints in STATE_JSON and reconcile only "
+        "teams whose projects changed since the last successful run",
+    )
+    argp.add_argument(
+        "--sample",
+        type=float,
+        default=0.05,
+        help="Fraction of unchanged teams to reconcile anyway, to detect "
+        "changes made on Codeberg (default: 0.05)",
+    )
+    argp.add_argument(
+        "--full",
+        action="store_true",
+        help="Reconcile all teams, ignoring the stored fingerprints",
+    )
+    argp.add_argument("devs_json", nargs="?", default="devs.json")
+    argp.add_argument("projects_index", nargs="?", default="projects-index.json")
+    args = argp.parse_args(argv[1:])
+
+    with open(os.path.expanduser("~/.codeberg-token")) as f:
+        api_token = f.read().strip()
+
+    fingerprints = {}
+    if args.state is not None:
+        try:
+            with open(args.state) as f:
+                fingerprints = json.load(f)
+        except (OSError, IOError):
+            pass
+
+    with CodebergAPI(
+        "gentoo",
+        "gentoo",
+        api_token,
+        cache=HTTPCache.from_env(),
+        stats=RequestStats.from_env(),
+        snapshot=OrgSnapshot.from_env(),
+    ) as cb:
+        read_failed = 0
+        if args.apply_plan is not None:
+            plan = Plan.load(args.apply_plan)
+        else:
+            plan, read_failed = make_plan(cb, args, fingerprints)
+            if args.save_plan is not None:
+                plan.show()
+                plan.save(args.save_plan)
+                if read_failed:
+                    print(f"ERROR: {read_failed} team(s) failed to read")
+                    return 1
+                return 0
+
+        def create_team(action: dict) -> None:
+            t = cb.create_team(ORG, action["team"], action["description"])
+            for m in action["members"]:
+                cb.team_add_member(t["id"], m)
+
+        failed = plan.apply(
+            {
+                "create_team": create_team,
+                "remove": lambda a: cb.team_remove_member(a["team_id"], a["user"]),
+                "add": lambda a: cb.team_add_member(a["team_id"], a["user"]),
+                "delete_team": lambda a: cb.org_delete_team(a["team_id"]),
+            },
+            args.jobs,
+        )
+
+        # refetch modified teams next time rather than trusting
+        # the in-place updates
+        if cb.snapshot is not None:
+            for action in plan.actions:
+                if "team_id" in action:
+                    cb.snapshot.discard(f"team/{action['team_id']}/members")
+                    cb.snapshot.discard(f"team/{action['team_id']}/repo_count")
+                if action["op"] in ("create_team", "delete_team"):
+                    cb.snapshot.discard(f"org/{ORG}/teams")
+                    cb.snapshot.discard(f"org/{ORG}/members")
+
+    if failed:
+        print(f"ERROR: {failed} team(s) failed to sync")
+        return 1
+
+    # store fingerprints only after everything was applied successfully
+    # (teams that failed to read have no fingerprint)
+    if args.state is not None and args.apply_plan is None:
+        with open(args.state, "w") as f:
+            json.dump(fingerprints, f, indent=0, sort_keys=True)
 
+    if read_failed:
+        print(f"ERROR: {read_failed} team(s) failed to read")
+        return 1
     return 0
 
 
 if __name__ == "__main__":
-    sys.exit(main(*sys.argv[1:]))
+    sys.exit(main(sys.argv))
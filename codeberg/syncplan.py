@@ -0,0 +1,100 @@
+import concurrent.futures
+import io
+import json
+import traceback
+
+from typing import Callable
+
+# actions are applied in stages: all actions in one stage finish before
+# the next stage starts
+STAGES = (
+    ("create_team",),
+    ("remove", "promote", "add"),
+    ("delete_team",),
+)
+
+FORMATS = {
+    "create_team": "CREATE TEAM {team}",
+    "remove": "REMOVE {user}",
+    "promote": "PROMOTE {user}",
+    "add": "ADD {user}",
+    "delete_team": "DELETE team {team}",
+}
+
+
+class Plan:
+    """
+    Complete list of changes needed to bring the forge in sync
+
+    Every action is a JSON-serializable dict with an "op" key (one of
+    the ops listed in STAGES) and a "team" key, plus op-specific data.
+    """
+
+    def __init__(self, actions: list[dict] = None):
+        self.actions = actions if actions is not None else []
+
+    def add(self, op: str, team: str, **kwargs) -> None:
+        self.actions.append({"op": op, "team": team, **kwargs})
+
+    @classmethod
+    def load(cls, path: str) -> "Plan":
+        with open(path) as f:
+            return cls(json.load(f)["actions"])
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"actions": self.actions}, f, indent=2)
+
+    @staticmethod
+    def describe(action: dict) -> str:
+        return FORMATS[action["op"]].format(**action)
+
+    def show(self) -> None:
+        team = None
+        for stage in STAGES:
+            for action in self.actions:
+                if action["op"] not in stage:
+                    continue
+                if action["team"] != team:
+                    team = action["team"]
+                    print(f"== {team} ==")
+                print(self.describe(action))
+
+    def apply(self, handlers: dict[str, Callable[[dict], None]], jobs: int) -> int:
+        """
+        Apply the plan, calling handlers[op](action) for every action
+
+        Within every stage, actions are grouped by team.  Different
+        teams are processed in parallel by jobs workers, actions
+        for a single team are applied in order.  If an action fails,
+        the remaining actions for the team are skipped.  Returns
+        the number of failed teams.
+        """
+
+        def apply_group(actions: list[dict]) -> tuple[str, bool]:
+            out = io.StringIO()
+            print(f"== {actions[0]['team']} ==", file=out)
+            for action in actions:
+                print(self.describe(action), file=out)
+                try:
+                    handlers[action["op"]](action)
+                except Exception:
+                    print("ERROR: applying action failed", file=out)
+                    traceback.print_exc(file=out)
+                    return out.getvalue(), False
+            return out.getvalue(), True
+
+        failed = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            for stage in STAGES:
+                groups = {}
+                for action in self.actions:
+                    if action["op"] in stage:
+                        groups.setdefault(action["team"], []).append(action)
+                # map() returns results in order, so output is grouped
+                # and deterministic
+                for output, success in executor.map(apply_group, groups.values()):
+                    print(output, end="")
+                    if not success:
+                        failed += 1
+        return failed
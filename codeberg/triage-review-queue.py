@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# Review PR submitter attributions deferred by update-pr-submitter-db
+# 2-clause BSD licensed
+
+import argparse
+import sys
+
+from maintsdb import MaintsDB
+from reviewqueue import ReviewQueue
+
+
+def show(entry: dict) -> None:
+    print("")
+    print(f"PR #{entry['pr']}: {entry['url']}")
+    print(entry["patch_url"])
+    print(f"submitter: {entry['submitter']}")
+    for role in ("committer", "author"):
+        p = entry[role]
+        print(f"{role}: {p['email']} ({p['name']}) [{p['login'] or 'no user'}]")
+    print(f"{entry['email']} -> {entry['login']}")
+
+
+def main(argv):
+    argp = argparse.ArgumentParser(prog=argv[0])
+    argp.add_argument(
+        "--db",
+        default="proxied-maints.db",
+        help="SQLite database to add accepted mappings to "
+        "(default: proxied-maints.db)",
+    )
+    argp.add_argument("queue_jsonl", nargs="?", default="review-queue.jsonl")
+    argp.add_argument("proxied_maints_json", nargs="?", default="proxied-maints.json")
+    args = argp.parse_args(argv[1:])
+
+    queue = ReviewQueue(args.queue_jsonl)
+    entries = queue.load()
+    remaining = []
+
+    with MaintsDB(args.db) as maints:
+        for i, entry in enumerate(entries):
+            # skip entries resolved in the meantime
+            if maints.get(entry["email"]) is not None or maints.has_login(
+                entry["submitter"]
+            ):
+                continue
+
+            show(entry)
+            try:
+                while True:
+                    resp = input("-> Accept? [Y/n/s(kip)/q(uit)]").lower()
+                    if resp in ("", "y", "n", "s", "q"):
+                        break
+            except (EOFError, KeyboardInterrupt):
+                resp = "q"
+
+            if resp == "q":
+                remaining.extend(entries[i:])
+                break
+            elif resp == "s":
+                remaining.append(entry)
+            elif resp != "n":
+                maints.set(entry["email"], entry["login"])
+
+        maints.export_json(args.proxied_maints_json)
+
+    queue.replace(remaining)
+    print(f"\n{len(remaining)} entries left in the queue")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -4,37 +4,160 @@
 # submitters
 # 2-clause BSD licensed
 
+import argparse
+import collections
+import concurrent.futures
+import datetime
 import json
 import os
 import os.path
 import sys
 
-from codebergapi import CodebergAPI
-
+from typing import Callable, Generator, Iterable, Optional
 
-def main(proxied_maints_json="proxied-maints.json"):
-    maints = {}
-    try:
-        with open(proxied_maints_json) as pm_f:
-            maints = json.load(pm_f)
-    except (OSError, IOError):
-        pass
+from codebergapi import CodebergAPI
+from httpcache import HTTPCache
+from maintsdb import MaintsDB
+from reviewqueue import ReviewQueue, person
+from stats import RequestStats
+
+
+def parse_time(value: str) -> datetime.datetime:
+    # fromisoformat() accepts the "Z" suffix only since Python 3.11
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def prefetch_first_commits(
+    cb: CodebergAPI,
+    prs: Iterable[dict],
+    is_known: Callable[[str], bool],
+    window: int,
+) -> Generator[None, tuple[dict, Optional[dict]], None]:
+    """
+    Yield (pr, first commit) pairs in the original PR order
+
+    Commits are prefetched only for PRs whose submitter is not known
+    yet, up to window PRs ahead concurrently.  Since earlier PRs may
+    change the answer, the submitter is checked again when the PR is
+    yielded, and commits are fetched on demand if it is still unknown.
+    None is yielded for PRs whose submitter is known, and for PRs
+    without commits.
+    """
+
+    def first_commit(pr: dict, f: Optional[concurrent.futures.Future]):
+        if f is not None:
+            return f.result()
+        if is_known(pr["user"]["login"]):
+            return None
+        return cb.first_commit(pr["number"])
+
+    pending = collections.deque()
+    in_flight = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=window) as executor:
+        for pr in prs:
+            f = None
+            if not is_known(pr["user"]["login"]):
+                f = executor.submit(cb.first_commit, pr["number"])
+                in_flight += 1
+            pending.append((pr, f))
+
+            while pending and (pending[0][1] is None or in_flight > window):
+                pr, f = pending.popleft()
+                if f is not None:
+                    in_flight -= 1
+                yield pr, first_commit(pr, f)
+
+        for pr, f in pending:
+            yield pr, first_commit(pr, f)
+
+
+def main(argv):
+    argp = argparse.ArgumentParser(prog=argv[0])
+    argp.add_argument(
+        "--state",
+        metavar="STATE_JSON",
+        help="Store the last update time of processed PRs in STATE_JSON "
+        "and process only PRs updated since then",
+    )
+    argp.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=8,
+        help="Number of PRs to fetch commits for concurrently",
+    )
+    argp.add_argument(
+        "--defer",
+        metavar="QUEUE_JSONL",
+        help="Instead of asking for confirmation, append uncertain "
+        "attributions to QUEUE_JSONL for triage-review-queue.py",
+    )
+    argp.add_argument(
+        "--full",
+        action="store_true",
+        help="Process all PRs, ignoring the stored update time",
+    )
+    argp.add_argument(
+        "--db",
+        default="proxied-maints.db",
+        help="SQLite database to store the mapping in (imported from "
+        "proxied_maints_json if empty, default: proxied-maints.db)",
+    )
+    argp.add_argument("proxied_maints_json", nargs="?", default="proxied-maints.json")
+    args = argp.parse_args(argv[1:])
+    proxied_maints_json = args.proxied_maints_json
+    queue = ReviewQueue(args.defer) if args.defer is not None else None
+
+    watermark = None
+    if args.state is not None and not args.full:
+        try:
+            with open(args.state) as f:
+                watermark = parse_time(json.load(f)["updated_at"])
+        except (OSError, IOError, ValueError, KeyError):
+            pass
+    new_watermark = watermark
 
     with open(os.path.expanduser("~/.codeberg-token")) as f:
         api_token = f.read().strip()
 
-    with CodebergAPI("gentoo", "gentoo", api_token) as cb:
-        for pr in cb.pulls(state="all"):
+    # fetch the next PR pages while we're processing the current one
+    with MaintsDB(args.db) as maints, CodebergAPI(
+        "gentoo",
+        "gentoo",
+        api_token,
+        readahead=2,
+        cache=HTTPCache.from_env(),
+        stats=RequestStats.from_env(),
+    ) as cb:
+        if not len(maints):
+            maints.import_json(proxied_maints_json)
+
+        def updated_prs() -> Generator[None, dict, None]:
+            nonlocal new_watermark
+            # newest first, so that we can stop at the first PR that was
+            # not updated since the last run
+            for pr in cb.pulls(state="all", sort="recentupdate"):
+                updated_at = parse_time(pr["updated_at"])
+                if watermark is not None and updated_at < watermark:
+                    break
+                if new_watermark is None or updated_at > new_watermark:
+                    new_watermark = updated_at
+                yield pr
+
+        for pr, c1 in prefetch_first_commits(
+            cb, updated_prs(), maints.has_login, args.jobs
+        ):
             print(f"PR #{pr['number']:04d}", end="")
 
             pr_user = pr["user"]["login"]
-            if pr_user not in maints.values():
-                commits = cb.commits(pr["number"])
-                if len(commits) == 0:
+            if not maints.has_login(pr_user):
+                if c1 is None:
+                    # commits of PRs with unknown submitters are always
+                    # fetched, so this PR has none
+                    print(f"\nPR #{pr['number']}: no commits. Skipping.")
                     continue
 
                 need_confirm = False
-                c1 = commits[0]
                 attributed = c1["committer"]
                 attributed_c = c1["commit"]["committer"]
 
@@ -74,6 +197,23 @@ def main(proxied_maints_json="proxied-maints.json"):
                     )
                     continue
 
+                if need_confirm and queue is not None:
+                    queue.append(
+                        {
+                            "pr": pr["number"],
+                            "url": pr["html_url"],
+                            "patch_url": pr["patch_url"],
+                            "submitter": pr_user,
+                            "email": attributed_c["email"],
+                            "login": attributed["login"],
+                            "committer": person(
+                                c1["commit"]["committer"], c1["committer"]
+                            ),
+                            "author": person(c1["commit"]["author"], c1["author"]),
+                        }
+                    )
+                    print("-> deferred")
+                    continue
                 if need_confirm:
                     escape = False
                     while True:
@@ -85,14 +225,17 @@ def main(proxied_maints_json="proxied-maints.json"):
                             break
                     if escape:
                         continue
-                maints[attributed_c["email"]] = attributed["login"]
+                maints.set(attributed_c["email"], attributed["login"])
+
+        maints.export_json(proxied_maints_json)
 
-    with open(proxied_maints_json, "w") as pm_f:
-        json.dump(maints, pm_f, indent=2)
+    if args.state is not None and new_watermark is not None:
+        with open(args.state, "w") as f:
+            json.dump({"updated_at": new_watermark.isoformat()}, f)
 
     print("")
     return 0
 
 
 if __name__ == "__main__":
-    sys.exit(main(*sys.argv[1:]))
+    sys.exit(main(sys.argv))
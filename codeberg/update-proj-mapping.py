@@ -7,37 +7,42 @@ import json
 import os.path
 import sys
 
-import lxml.etree
 from codebergapi import CodebergAPI
+from httpcache import HTTPCache
+from projects import ProjectIndex
+from snapshot import OrgSnapshot
+from stats import RequestStats
 
 
-def main(projects_xml="projects.xml", proj_map_json="proj-map.json"):
+def main(projects_index="projects-index.json", proj_map_json="proj-map.json"):
     with open(os.path.expanduser("~/.codeberg-token")) as f:
         api_token = f.read().strip()
 
-    projs_x = lxml.etree.parse(projects_xml)
-    projs = {}
-    for p in projs_x.getroot():
-        projs[p.findtext("email").split("@")[0].lower()] = p
-        projs[p.findtext("name").split("@")[0].replace(" ", "-").lower()] = p
-        projs[p.findtext("url").split(":")[2].replace(" ", "-").lower()] = p
+    projs = ProjectIndex(projects_index)
 
     proj_map = {}
-    rem_projs = set(p for p in projs_x.getroot())
-
-    with CodebergAPI("gentoo", "gentoo", api_token) as cb:
+    rem_projs = set(p["email"] for p in projs)
+
+    with CodebergAPI(
+        "gentoo",
+        "gentoo",
+        api_token,
+        cache=HTTPCache.from_env(),
+        stats=RequestStats.from_env(),
+        snapshot=OrgSnapshot.from_env(),
+    ) as cb:
         for t in cb.teams("gentoo"):
             tname = t["name"]
-            p = projs.get(tname.lower())
+            p = projs.lookup(tname)
             if p is None:
                 print(f"{tname} <-> ?")
             else:
-                print(f"{tname} <-> {p}")
-                proj_map[p.findtext("email").lower()] = "gentoo/" + tname
-                rem_projs.remove(p)
+                print(f"{tname} <-> {p['email']}")
+                proj_map[p["email"].lower()] = "gentoo/" + tname
+                rem_projs.remove(p["email"])
 
     for p in rem_projs:
-        print(f"MISSING PROJECT: {p.findtext('email')}")
+        print(f"MISSING PROJECT: {p}")
 
     with open(proj_map_json, "w") as f:
         json.dump(proj_map, f, indent=0, sort_keys=True)
@@ -0,0 +1,206 @@
+# vim:fileencoding=utf-8
+# Minimal GitHub GraphQL API client for bulk queries
+# 2-clause BSD licensed
+
+import requests
+import requests.adapters
+import urllib3.util.retry
+
+
+TEAMS_QUERY = '''
+query($org: String!, $cursor: String) {
+  organization(login: $org) {
+    teams(first: 25, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        databaseId
+        name
+        slug
+        repositories { totalCount }
+        members(first: 100, membership: ALL) {
+          pageInfo { hasNextPage endCursor }
+          edges { role node { login } }
+        }
+      }
+    }
+  }
+}
+'''
+
+TEAM_MEMBERS_QUERY = '''
+query($org: String!, $slug: String!, $cursor: String) {
+  organization(login: $org) {
+    team(slug: $slug) {
+      members(first: 100, after: $cursor, membership: ALL) {
+        pageInfo { hasNextPage endCursor }
+        edges { role node { login } }
+      }
+    }
+  }
+}
+'''
+
+ORG_MEMBERS_QUERY = '''
+query($org: String!, $cursor: String) {
+  organization(login: $org) {
+    membersWithRole(first: 100, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      edges { role node { login } }
+    }
+  }
+}
+'''
+
+PULL_REQUESTS_QUERY = '''
+query($owner: String!, $repo: String!, $cursor: String) {
+  repository(owner: $owner, name: $repo) {
+    pullRequests(first: 100, after: $cursor,
+                 orderBy: {field: UPDATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        number
+        url
+        updatedAt
+        author { login ... on User { name } }
+        commits(first: 1) {
+          nodes {
+            commit {
+              author { email name user { login name } }
+              committer { email name user { login name } }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+
+class GraphQL(object):
+    """
+    GitHub GraphQL API client
+
+    Used for reading data that would require many REST requests.
+    """
+
+    url = 'https://api.github.com/graphql'
+
+    def __init__(self, token, timeout=60, retries=5):
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = 'bearer %s' % token
+        # GraphQL queries are read-only, so POST is safe to repeat;
+        # large nested queries fail with 502 or 504 every now and then
+        retry = urllib3.util.retry.Retry(
+            total=retries, backoff_factor=1,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(['POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False)
+        self.session.mount('https://',
+                           requests.adapters.HTTPAdapter(max_retries=retry))
+        self.timeout = timeout
+
+    def query(self, query, **variables):
+        r = self.session.post(self.url, json={
+            'query': query,
+            'variables': variables,
+        }, timeout=self.timeout)
+        r.raise_for_status()
+        data = r.json()
+        if data.get('errors'):
+            raise RuntimeError('GraphQL query failed: %s'
+                               % '; '.join(e['message'] for e in data['errors']))
+        return data['data']
+
+    def paginate(self, query, path, cursor=None, **variables):
+        """
+        Iterate over all pages of the connection at path (a tuple
+        of keys starting at query result), yielding connection dicts
+        """
+        while True:
+            conn = self.query(query, cursor=cursor, **variables)
+            for k in path:
+                conn = conn[k]
+            yield conn
+            if not conn['pageInfo']['hasNextPage']:
+                break
+            cursor = conn['pageInfo']['endCursor']
+
+    def org_members(self, org):
+        """
+        Get a dict of organization member logins to their roles
+        ('ADMIN' or 'MEMBER')
+        """
+        ret = {}
+        for conn in self.paginate(ORG_MEMBERS_QUERY,
+                                  ('organization', 'membersWithRole'),
+                                  org=org):
+            for e in conn['edges']:
+                ret[e['node']['login']] = e['role']
+        return ret
+
+    def teams(self, org):
+        """
+        Get all teams in the organization, along with their members
+
+        Every team is a dict with id, name, slug, repo_count and members
+        keys.  members maps logins to team roles ('MAINTAINER'
+        or 'MEMBER'), and includes members of child teams.
+        """
+        for conn in self.paginate(TEAMS_QUERY, ('organization', 'teams'),
+                                  org=org):
+            for t in conn['nodes']:
+                members = {}
+                for e in t['members']['edges']:
+                    members[e['node']['login']] = e['role']
+
+                # fetch remaining members of large teams
+                page_info = t['members']['pageInfo']
+                if page_info['hasNextPage']:
+                    for mconn in self.paginate(
+                            TEAM_MEMBERS_QUERY,
+                            ('organization', 'team', 'members'),
+                            cursor=page_info['endCursor'],
+                            org=org, slug=t['slug']):
+                        for e in mconn['edges']:
+                            members[e['node']['login']] = e['role']
+
+                yield {
+                    'id': t['databaseId'],
+                    'name': t['name'],
+                    'slug': t['slug'],
+                    'repo_count': t['repositories']['totalCount'],
+                    'members': members,
+                }
+
+    def pull_requests(self, owner, repo):
+        """
+        Iterate over all pull requests in the repository, most recently
+        updated first
+
+        Every pull request is a dict with number, url, updated_at, user
+        and first_commit keys.  user is a dict with login and name keys,
+        or None if the account was deleted.  first_commit is None if
+        the pull request has no commits, or a dict with author
+        and committer keys, holding dicts with email, name and user
+        (the matched GitHub user, or None) keys.
+        """
+        for conn in self.paginate(PULL_REQUESTS_QUERY,
+                                  ('repository', 'pullRequests'),
+                                  owner=owner, repo=repo):
+            for pr in conn['nodes']:
+                author = pr['author']
+                if author is not None:
+                    author = {
+                        'login': author['login'],
+                        'name': author.get('name'),
+                    }
+                commits = pr['commits']['nodes']
+                yield {
+                    'number': pr['number'],
+                    'url': pr['url'],
+                    'updated_at': pr['updatedAt'],
+                    'user': author,
+                    'first_commit': commits[0]['commit'] if commits else None,
+                }
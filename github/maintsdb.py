@@ -0,0 +1,85 @@
+# vim:fileencoding=utf-8
+# SQLite store for the e-mail -> GitHub login mapping
+# 2-clause BSD licensed
+
+import json
+import sqlite3
+
+
+class MaintsDB(object):
+    """
+    SQLite store mapping e-mail addresses to GitHub logins
+
+    Lookups by e-mail and by login are indexed.  Changes are committed
+    in batches of batch_size, and on leaving the context (even if due
+    to an exception), so an interrupted run loses no more than the last
+    batch.
+    """
+
+    def __init__(self, path, batch_size=20):
+        self.batch_size = batch_size
+        self._pending = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS maints '
+                        '(email TEXT PRIMARY KEY, login TEXT NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS maints_login '
+                        'ON maints (login)')
+        self.db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM maints').fetchone()[0]
+
+    def import_json(self, path):
+        """
+        Import mapping from JSON file at path, if it exists
+        """
+        try:
+            with open(path) as f:
+                maints = json.load(f)
+        except (OSError, IOError):
+            return
+        self.db.executemany(
+            'INSERT OR REPLACE INTO maints (email, login) VALUES (?, ?)',
+            maints.items())
+        self.db.commit()
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f)
+
+    def as_dict(self):
+        return dict(self.db.execute(
+            'SELECT email, login FROM maints ORDER BY rowid'))
+
+    def get(self, email):
+        row = self.db.execute('SELECT login FROM maints WHERE email = ?',
+                              (email,)).fetchone()
+        return row[0] if row is not None else None
+
+    def has_login(self, login):
+        return self.db.execute(
+            'SELECT 1 FROM maints WHERE login = ? LIMIT 1',
+            (login,)).fetchone() is not None
+
+    def set(self, email, login):
+        self.db.execute(
+            'INSERT OR REPLACE INTO maints (email, login) VALUES (?, ?)',
+            (email, login))
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
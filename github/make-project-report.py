@@ -12,14 +12,14 @@ import pwd
 import sys
 import textwrap
 
-import lxml.etree
+from projects import ProjectIndex
 
 
 class Member(object):
-    __slots__ = ('xml', 'gh', 'on_alias')
+    __slots__ = ('data', 'gh', 'on_alias')
 
-    def __init__(self, xml, devs, aliases):
-        self.xml = xml
+    def __init__(self, data, devs, aliases):
+        self.data = data
         self.gh = devs.get(self.email.lower())
         if self.gh == "":
             self.gh = None
@@ -27,19 +27,19 @@ class Member(object):
 
     @property
     def email(self):
-        return self.xml.findtext('email')
+        return self.data['email']
 
     @property
     def name(self):
-        return self.xml.findtext('name')
+        return self.data['name']
 
     @property
     def role(self):
-        return self.xml.findtext('role')
+        return self.data['role']
 
     @property
     def is_lead(self):
-        return bool(int(self.xml.get('is-lead', '0')))
+        return self.data['is_lead']
 
     @property
     def on_github(self):
@@ -47,40 +47,40 @@ class Member(object):
 
 
 class Subproject(object):
-    __slots__ = ('xml')
+    __slots__ = ('data')
 
-    def __init__(self, xml):
-        self.xml = xml
+    def __init__(self, data):
+        self.data = data
 
     @property
     def email(self):
-        return self.xml.get('ref')
+        return self.data['ref']
 
     @property
     def inherit_members(self):
-        return bool(int(self.xml.get('inherit-members', '0')))
+        return self.data['inherit_members']
 
 
 class Project(object):
-    __slots__ = ('xml', 'gh', 'devs', 'aliases')
+    __slots__ = ('data', 'gh', 'devs', 'aliases')
 
-    def __init__(self, xml, proj_map, devs, aliases):
-        self.xml = xml
+    def __init__(self, data, proj_map, devs, aliases):
+        self.data = data
         self.gh = proj_map.get(self.email.lower())
         self.devs = devs
         self.aliases = aliases
 
     @property
     def email(self):
-        return self.xml.findtext('email')
+        return self.data['email']
 
     @property
     def name(self):
-        return self.xml.findtext('name')
+        return self.data['name']
 
     @property
     def url(self):
-        return self.xml.findtext('url')
+        return self.data['url']
 
     @property
     def github(self):
@@ -91,17 +91,17 @@ class Project(object):
 
     @property
     def description(self):
-        return self.xml.findtext('description')
+        return self.data['description']
 
     @property
     def members(self):
-        for m in self.xml.findall('member'):
+        for m in self.data['members']:
             yield Member(m, self.devs,
                     self.aliases.get(self.email.split('@')[0].lower(), ()))
 
     @property
     def subprojects(self):
-        for sp in self.xml.findall('subproject'):
+        for sp in self.data['subprojects']:
             yield Subproject(sp)
 
 
@@ -204,10 +204,10 @@ If you have any questions, feel free to ask.
     return body
 
 
-def main(projects_xml='projects.xml', proj_map_json='proj-map.json',
+def main(projects_index='projects-index.json', proj_map_json='proj-map.json',
         devs_json='devs.json', master_aliases='master.aliases',
         proj_reports='proj-reports'):
-    projs_x = lxml.etree.parse(projects_xml)
+    projs = ProjectIndex(projects_index)
     with open(devs_json) as devs_f:
         devs = json.load(devs_f)
     with open(proj_map_json) as proj_map_f:
@@ -237,8 +237,8 @@ Yours sincerely,
 {}'''.format(fullname)
 
     os.makedirs(proj_reports, exist_ok=True)
-    for px in projs_x.getroot():
-        p = Project(px, proj_map, devs, aliases)
+    for pd in projs:
+        p = Project(pd, proj_map, devs, aliases)
 
         msg = email.message.Message()
         msg.set_charset(charset)
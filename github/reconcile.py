@@ -0,0 +1,73 @@
+# vim:fileencoding=utf-8
+# Reconcile developer list with organization membership
+# 2-clause BSD licensed
+
+import concurrent.futures
+
+
+class Reconciliation(object):
+    """
+    Changes needed to bring the developers team and the organization
+    in sync with the developer list
+
+    desired maps logins to all e-mail addresses of the developer
+    (devs maps every address to a login, so one developer may have
+    multiple addresses).  Developers missing from the team are invited,
+    organization members that are not developers are removed.
+    Developers with pending invitations (logins in pending) are not
+    invited again.
+    """
+
+    def __init__(self, devs, team_members, org_members, pending=()):
+        self.desired = {}
+        for email, login in sorted(devs.items()):
+            if login:
+                self.desired.setdefault(login, []).append(email)
+        missing = set(self.desired) - set(team_members)
+        self.already_invited = sorted(missing & set(pending))
+        self.to_invite = sorted(missing - set(pending))
+        self.to_remove = sorted(set(org_members) - set(self.desired))
+
+    def actions(self):
+        return ([('INVITE', login) for login in self.to_invite]
+                + [('REMOVE', login) for login in self.to_remove])
+
+    def describe(self, op, login):
+        if op == 'INVITE':
+            return '%s %s (%s)' % (op, login, ', '.join(self.desired[login]))
+        return '%s %s' % (op, login)
+
+    def apply(self, invite, remove, jobs):
+        """
+        Apply the changes using jobs workers
+
+        Failed actions are not retried here, since PyGithub already
+        retries transient errors.
+
+        Prints the actions in order, followed by a summary.  Returns
+        the number of actions that failed.
+        """
+        handlers = {'INVITE': invite, 'REMOVE': remove}
+
+        def run(action):
+            op, login = action
+            try:
+                handlers[op](login)
+            except Exception as e:
+                return e
+            return None
+
+        actions = self.actions()
+        failed = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            # map() returns results in order, so output is deterministic
+            for action, err in zip(actions, executor.map(run, actions)):
+                print(self.describe(*action))
+                if err is not None:
+                    print('ERROR: %s' % (err,))
+                    failed += 1
+
+        print('%d to invite (%d already invited), %d to remove, %d failed'
+              % (len(self.to_invite), len(self.already_invited),
+                 len(self.to_remove), failed))
+        return failed
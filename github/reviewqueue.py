@@ -0,0 +1,62 @@
+# vim:fileencoding=utf-8
+# Queue of PR attributions awaiting manual review
+# 2-clause BSD licensed
+
+import json
+
+
+def person(c, user):
+    """
+    Make queue entry evidence from commit author/committer and user
+    """
+    return {
+        'email': c['email'],
+        'name': c['name'],
+        'login': user['login'] if user is not None else None,
+    }
+
+
+class ReviewQueue(object):
+    """
+    Queue of attributions awaiting manual review, stored as JSON lines
+
+    Every entry is a dict with the following keys:
+    - pr, url, patch_url: PR number and URLs
+    - submitter: login of the PR submitter
+    - email, login: the proposed mapping
+    - committer, author: dicts with email, name and login (or None)
+      of the first commit's committer and author
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, entry):
+        # reopen for every entry, so that entries are not lost
+        # if the crawl is interrupted
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def load(self):
+        """
+        Load queued entries, skipping duplicate mappings
+        """
+        ret = {}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        ret.setdefault((entry['email'], entry['login']),
+                                       entry)
+        except (OSError, IOError):
+            pass
+        return list(ret.values())
+
+    def replace(self, entries):
+        """
+        Replace queue contents with entries
+        """
+        with open(self.path, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
@@ -3,6 +3,8 @@
 # Sync developers team on GitHub (invite or remove)
 # (c) 2016 Michał Górny, 2-clause BSD licensed
 
+import argparse
+import datetime
 import json
 import os
 import os.path
@@ -10,13 +12,30 @@ import sys
 
 import github
 
+from reconcile import Reconciliation
 
-def main(devs_json='devs.json'):
-    with open(devs_json) as devs_f:
+
+def main(argv):
+    argp = argparse.ArgumentParser(prog=argv[0])
+    argp.add_argument('-j', '--jobs', type=int, default=1,
+                      help='Number of invitations and removals to apply '
+                           'concurrently (GitHub discourages concurrent '
+                           'mutations)')
+    argp.add_argument('--stale-days', type=int, default=7,
+                      help='Report pending invitations older than this '
+                           'many days as stale (default: 7)')
+    argp.add_argument('--expire-stale', action='store_true',
+                      help='Cancel stale invitations, and invitations '
+                           'of users that are not developers')
+    argp.add_argument('devs_json', nargs='?', default='devs.json')
+    args = argp.parse_args(argv[1:])
+
+    with open(args.devs_json) as devs_f:
         devs = json.load(devs_f)
 
     with open(os.path.expanduser('~/.github-token')) as f:
-        gh = github.Github(f.read().strip())
+        token = f.read().strip()
+    gh = github.Github(token)
 
     org = gh.get_organization('gentoo')
     for t in org.get_teams():
@@ -25,25 +44,49 @@ def main(devs_json='devs.json'):
     else:
         raise RuntimeError('Unable to find developers team')
 
-    members = frozenset(m.login for m in t.get_members())
-    remaining = set(m.login for m in org.get_members())
-    revmap = dict((v, k) for k, v in devs.items())
+    members = [m.login for m in t.get_members()]
+    org_members = [m.login for m in org.get_members()]
 
-    for ghdev, dev in revmap.items():
-        if not ghdev:
-            continue
-        if ghdev not in members:
-            print('INVITE %s (%s)' % (ghdev, dev))
-            t.add_membership(gh.get_user(ghdev))
+    # index pending invitations by login, so that developers who did
+    # not accept yet are not invited again (invitations by e-mail
+    # can't be matched)
+    invitations = dict((inv.login, inv) for inv in org.invitations()
+                       if inv.login)
+
+    rec = Reconciliation(devs, members, org_members, pending=invitations)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    stale = []
+    for login, inv in sorted(invitations.items()):
+        age = (now - inv.created_at).days
+        if login not in rec.desired:
+            print('STALE INVITATION %s (not a developer)' % login)
+        elif age >= args.stale_days:
+            print('STALE INVITATION %s (%d days old)' % (login, age))
         else:
-            remaining.discard(ghdev)
+            continue
+        stale.append(inv)
+
+    failed = rec.apply(
+        lambda login: t.add_membership(gh.get_user(login, lazy=True)),
+        lambda login: org.remove_from_members(
+            gh.get_user(login, lazy=True)),
+        args.jobs)
 
-    for m in remaining:
-        print('REMOVE %s' % m)
-        org.remove_from_members(gh.get_user(m))
+    if args.expire_stale:
+        for inv in stale:
+            print('CANCEL INVITATION %s' % inv.login)
+            try:
+                org.cancel_invitation(inv)
+            except github.GithubException as e:
+                print('ERROR: %s' % (e,))
+                failed += 1
+    elif stale:
+        print('%d stale invitation(s), use --expire-stale to cancel them'
+              % len(stale))
 
-    return 0
+    return 1 if failed else 0
 
 
 if __name__ == '__main__':
-    sys.exit(main(*sys.argv[1:]))
+    sys.exit(main(sys.argv))
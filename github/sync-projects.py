@@ -3,70 +3,66 @@
 # Sync projects to GitHub
 # (c) 2016 Michał Górny, 2-clause BSD licensed
 
+import argparse
 import json
 import os.path
+import random
 import sys
 
 import github
-import lxml.etree
 
+from ghgraphql import GraphQL
+from projects import ProjectIndex, fingerprint
+from syncplan import Plan
 
-def add_members(members, p, xmltree):
-    members += [m.findtext('email').lower() for m in p.findall('member')]
 
-    for subp in p.findall('subproject'):
-        if subp.get('inherit-members') == '1':
-            subp_email = subp.get('ref')
-            for op in xmltree:
-                if op.findtext('email') == subp_email:
-                    add_members(members, op, xmltree)
+def make_plan(gql, fingerprints, args):
+    """
+    Read the current state and compute the changes needed
 
+    All teams and their members are fetched in bulk via GraphQL.
 
-def main(devs_json='devs.json', projects_xml='projects.xml'):
-    with open(devs_json) as devs_f:
+    fingerprints maps team ids to fingerprints of the projects they
+    were last synced to.  Teams whose fingerprint did not change
+    are skipped (unless randomly sampled for drift detection),
+    and fingerprints is updated to the current values.
+    """
+    with open(args.devs_json) as devs_f:
         devs = json.load(devs_f)
 
-    with open(os.path.expanduser('~/.github-token')) as f:
-        gh = github.Github(f.read().strip())
-
-    projs_x = lxml.etree.parse(projects_xml)
-    projs = {}
-    for p in projs_x.getroot():
-        projs[p.findtext('email').split('@')[0].lower()] = p
-        projs[p.findtext('name').split('@')[0].lower()] = p
-        projs[p.findtext('url').split(':')[2].lower()] = p
+    projs = ProjectIndex(args.projects_index)
 
     gh_devs = set(devs.values())
-    rem_projs = set(p for p in projs_x.getroot())
-
-    gh_users_cache = {}
-    def gh_users_to_login(it):
-        for u in it:
-            gh_users_cache.setdefault(u.login, u)
-            yield u.login
-    def gh_get_user(x):
-        if not x in gh_users_cache:
-            gh_users_cache[x] = gh.get_user(x)
-        return gh_users_cache[x]
+    rem_projs = dict((p['email'], p) for p in projs)
 
-    gorg = gh.get_organization('gentoo')
-    owners = set(gh_users_to_login(gorg.get_members(role='admin')))
+    owners = set(login for login, role
+                 in gql.org_members('gentoo').items()
+                 if role == 'ADMIN')
+    plan = Plan()
 
-    for t in gorg.get_teams():
-        p = projs.get(t.name.lower())
+    for t in gql.teams('gentoo'):
+        p = projs.lookup(t['name'])
         if p is not None:
-            print('%s <-> %s' % (t.name, p))
-            rem_projs.remove(p)
+            del rem_projs[p['email']]
             # members = all project members by e-mail
-            members = []
-            add_members(members, p, projs_x.getroot())
+            members = p['all_members']
+
+            fp = fingerprint(members, p['description'], devs)
+            old_fp = fingerprints.get(str(t['id']))
+            fingerprints[str(t['id'])] = fp
+            if (not args.full and fp == old_fp
+                    and random.random() >= args.sample):
+                continue
+
+            print('%s <-> %s' % (t['name'], p['email']))
             # gh_members = all project members mapped to github logins
             gh_members = set(devs[x] for x in members if devs[x])
 
-            # team_members = all gh team members, as github.User
-            team_members = set(gh_users_to_login(t.get_members()))
-            # team_maints = gh team maintainers, as github.User
-            team_maints = set(gh_users_to_login(t.get_members(role='maintainer')))
+            # team_members = all gh team members, as logins
+            team_members = set(t['members'])
+            # team_maints = gh team maintainers, as logins
+            team_maints = set(m for m, role in t['members'].items()
+                              if role == 'MAINTAINER')
 
             # owners can't be maints, so assume they are promoted
             team_maints |= team_members & owners
@@ -74,56 +70,49 @@ def main(devs_json='devs.json', projects_xml='projects.xml'):
             # remove extraneous gh team members that do have dev acct
             # (i.e. most likely left the team)
             extra_gh_members = team_members - gh_members
-            for m in extra_gh_members:
+            for m in sorted(extra_gh_members):
                 if m in gh_devs:
-                    print('REMOVE %s' % m)
-                    t.remove_from_members(gh_get_user(m))
+                    plan.add('remove', t['name'], team_id=t['id'], user=m)
                     team_members.discard(m)
 
             # promote devs on the team to maintainers
             non_promoted_members = team_members - team_maints
-            for m in non_promoted_members:
+            for m in sorted(non_promoted_members):
                 if m in gh_devs:
-                    print('PROMOTE %s' % m)
-                    t.add_membership(gh_get_user(m), role='maintainer')
+                    plan.add('promote', t['name'], team_id=t['id'], user=m)
 
             # add new devs to the team
             extra_devs = gh_members - team_members
-            for m in extra_devs:
-                print('ADD %s' % m)
-                if m in owners:
-                    # owner can't be maintainer
-                    t.add_membership(gh_get_user(m))
-                else:
-                    t.add_membership(gh_get_user(m), role='maintainer')
+            for m in sorted(extra_devs):
+                # owner can't be maintainer
+                plan.add('add', t['name'], team_id=t['id'], user=m,
+                         role=None if m in owners else 'maintainer')
                 team_members.add(m)
 
             # empty now? remove it
             if not team_members:
-                if not list(t.get_repos()):
-                    print('DELETE TEAM')
-                    t.delete()
+                if not t['repo_count']:
+                    plan.add('delete_team', t['name'], team_id=t['id'])
                 else:
                     print('EMPTY TEAM WITH REPOS')
         else:
-            print('%s <-> ?' % (t.name,))
+            print('%s <-> ?' % (t['name'],))
 
-    for p in rem_projs:
+    for p in rem_projs.values():
         names = [
-            p.findtext('email').split('@')[0],
-            p.findtext('name').lower(),
-            p.findtext('name'),
-            p.findtext('url').split(':')[2].lower(),
-            p.findtext('url').split(':')[2]
+            p['email'].split('@')[0],
+            p['name'].lower(),
+            p['name'],
+            p['url'].split(':')[2].lower(),
+            p['url'].split(':')[2]
         ]
         seen = {}
         names = [seen.setdefault(x, x) for x in names if x not in seen]
-        desc = p.findtext('description')
-        members = []
-        add_members(members, p, projs_x.getroot())
+        desc = p['description']
+        members = p['all_members']
 
         if not members:
-            if not p.findall('subproject'):
+            if not p['subprojects']:
                 print('WARN: %s project has no developers!' % names[0])
             else:
                 print('NOTE: %s project purely organizational (no members)' % names[0])
@@ -151,18 +140,106 @@ def main(devs_json='devs.json', projects_xml='projects.xml'):
             resp = '1'
         name = names[int(resp)-1]
 
-        print('CREATE TEAM %s' % name)
-        t = gorg.create_team(name, description=desc, privacy='closed')
-        for m in gh_members:
-            print('ADD %s' % m)
-            if m in owners:
-                # owner can't be maintainer
-                t.add_membership(gh_get_user(m))
-            else:
-                t.add_membership(gh_get_user(m), role='maintainer')
+        plan.add('create_team', name, description=desc, members=[
+            {'user': m, 'role': None if m in owners else 'maintainer'}
+            for m in gh_members])
+
+    return plan
+
+
+def main(argv):
+    argp = argparse.ArgumentParser(prog=argv[0])
+    argp.add_argument('-j', '--jobs', type=int, default=1,
+                      help='Number of teams to update concurrently '
+                           '(GitHub discourages concurrent mutations)')
+    plan_group = argp.add_mutually_exclusive_group()
+    plan_group.add_argument('--save-plan', metavar='PLAN_JSON',
+                            help='Only compute the changes and save them '
+                                 'to PLAN_JSON')
+    plan_group.add_argument('--apply-plan', metavar='PLAN_JSON',
+                            help='Apply changes from PLAN_JSON instead '
+                                 'of computing them')
+    argp.add_argument('--state', metavar='STATE_JSON',
+                      help='Store project fingerprints in STATE_JSON and '
+                           'reconcile only teams whose projects changed '
+                           'since the last successful run')
+    argp.add_argument('--sample', type=float, default=0.05,
+                      help='Fraction of unchanged teams to reconcile anyway, '
+                           'to detect changes made on GitHub (default: 0.05)')
+    argp.add_argument('--full', action='store_true',
+                      help='Reconcile all teams, ignoring the stored '
+                           'fingerprints')
+    argp.add_argument('devs_json', nargs='?', default='devs.json')
+    argp.add_argument('projects_index', nargs='?',
+                      default='projects-index.json')
+    args = argp.parse_args(argv[1:])
+
+    with open(os.path.expanduser('~/.github-token')) as f:
+        token = f.read().strip()
+    gh = github.Github(token)
 
+    gorg = gh.get_organization('gentoo')
+    teams = {}
+
+    fingerprints = {}
+    if args.state is not None:
+        try:
+            with open(args.state) as f:
+                fingerprints = json.load(f)
+        except (OSError, IOError):
+            pass
+
+    if args.apply_plan is not None:
+        plan = Plan.load(args.apply_plan)
+    else:
+        plan = make_plan(GraphQL(token), fingerprints, args)
+        if args.save_plan is not None:
+            plan.show()
+            plan.save(args.save_plan)
+            return 0
+
+    def gh_get_user(login):
+        # membership calls need only the login, so do not fetch users
+        return gh.get_user(login, lazy=True)
+
+    def gh_get_team(team_id):
+        if team_id not in teams:
+            teams[team_id] = gorg.get_team(team_id)
+        return teams[team_id]
+
+    def add_membership(t, user, role):
+        if role is None:
+            t.add_membership(gh_get_user(user))
+        else:
+            t.add_membership(gh_get_user(user), role=role)
+
+    def create_team(a):
+        t = gorg.create_team(a['team'], description=a['description'],
+                             privacy='closed')
+        for m in a['members']:
+            add_membership(t, m['user'], m['role'])
+
+    failed = plan.apply({
+        'create_team': create_team,
+        'remove': lambda a: gh_get_team(a['team_id']).remove_from_members(
+            gh_get_user(a['user'])),
+        'promote': lambda a: gh_get_team(a['team_id']).add_membership(
+            gh_get_user(a['user']), role='maintainer'),
+        'add': lambda a: add_membership(gh_get_team(a['team_id']),
+                                        a['user'], a['role']),
+        'delete_team': lambda a: gh_get_team(a['team_id']).delete(),
+    }, args.jobs)
+
+    if failed:
+        print('ERROR: %d team(s) failed to sync' % failed)
+        return 1
+
+    # store fingerprints only after everything was applied successfully
+    if args.state is not None and args.apply_plan is None:
+        with open(args.state, 'w') as f:
+            json.dump(fingerprints, f, indent=0, sort_keys=True)
     return 0
 
 
 if __name__ == '__main__':
-    sys.exit(main(*sys.argv[1:]))
+    sys.exit(main(sys.argv))
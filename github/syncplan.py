@@ -0,0 +1,105 @@
+# vim:fileencoding=utf-8
+# Plan of changes to apply to GitHub teams
+# 2-clause BSD licensed
+
+import concurrent.futures
+import io
+import json
+import traceback
+
+
+# actions are applied in stages: all actions in one stage finish before
+# the next stage starts
+STAGES = (
+    ('create_team',),
+    ('remove', 'promote', 'add'),
+    ('delete_team',),
+)
+
+FORMATS = {
+    'create_team': 'CREATE TEAM {team}',
+    'remove': 'REMOVE {user}',
+    'promote': 'PROMOTE {user}',
+    'add': 'ADD {user}',
+    'delete_team': 'DELETE TEAM {team}',
+}
+
+
+class Plan(object):
+    """
+    Complete list of changes needed to bring GitHub in sync
+
+    Every action is a JSON-serializable dict with an 'op' key (one of
+    the ops listed in STAGES) and a 'team' key, plus op-specific data.
+    """
+
+    def __init__(self, actions=None):
+        self.actions = actions if actions is not None else []
+
+    def add(self, op, team, **kwargs):
+        kwargs.update(op=op, team=team)
+        self.actions.append(kwargs)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f)['actions'])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'actions': self.actions}, f, indent=2)
+
+    @staticmethod
+    def describe(action):
+        return FORMATS[action['op']].format(**action)
+
+    def show(self):
+        team = None
+        for stage in STAGES:
+            for action in self.actions:
+                if action['op'] not in stage:
+                    continue
+                if action['team'] != team:
+                    team = action['team']
+                    print('== %s ==' % team)
+                print(self.describe(action))
+
+    def apply(self, handlers, jobs=1):
+        """
+        Apply the plan, calling handlers[op](action) for every action
+
+        Within every stage, actions are grouped by team.  Different
+        teams are processed in parallel by jobs workers, actions
+        for a single team are applied in order.  If an action fails,
+        the remaining actions for the team are skipped.  Returns
+        the number of failed teams.
+        """
+
+        def apply_group(actions):
+            out = io.StringIO()
+            print('== %s ==' % actions[0]['team'], file=out)
+            for action in actions:
+                print(self.describe(action), file=out)
+                try:
+                    handlers[action['op']](action)
+                except Exception:
+                    print('ERROR: applying action failed', file=out)
+                    traceback.print_exc(file=out)
+                    return out.getvalue(), False
+            return out.getvalue(), True
+
+        failed = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            for stage in STAGES:
+                groups = {}
+                for action in self.actions:
+                    if action['op'] in stage:
+                        groups.setdefault(action['team'], []).append(action)
+                # map() returns results in order, so output is grouped
+                # and deterministic
+                for output, success in executor.map(apply_group,
+                                                    groups.values()):
+                    print(output, end='')
+                    if not success:
+                        failed += 1
+        return failed
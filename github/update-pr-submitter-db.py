@@ -3,84 +3,154 @@
 # Create or update JSON mapping of email->gh for pull request submitters
 # (c) 2016 Michał Górny, 2-clause BSD licensed
 
+import argparse
 import json
 import os
 import os.path
 import sys
 
-import github
+from ghgraphql import GraphQL
+from maintsdb import MaintsDB
+from reviewqueue import ReviewQueue, person
 
 
-def main(proxied_maints_json='proxied-maints.json'):
-    maints = {}
-    try:
-        with open(proxied_maints_json) as pm_f:
-            maints = json.load(pm_f)
-    except (OSError, IOError):
-        pass
+def attribute(pr):
+    """
+    Find whom to attribute the PR (as returned by GraphQL.pull_requests())
+    to, based on its first commit
+
+    Returns a tuple of (email, login, need_confirm), or None if the PR
+    has no commits.
+    """
+    c1 = pr['first_commit']
+    if c1 is None:
+        return None
+
+    pr_login = pr['user']['login']
+    attributed = c1['committer']['user']
+    attributed_c = c1['committer']
+    if ((attributed is None or attributed['login'] != pr_login)
+            and c1['author']['user'] is not None
+            and c1['author']['user']['login'] == pr_login):
+        attributed = c1['author']['user']
+        attributed_c = c1['author']
+
+    if attributed is not None and attributed['login'] == pr_login:
+        print('\n%s -> %s' % (attributed_c['email'], attributed['login']))
+        return attributed_c['email'], attributed['login'], False
+
+    print('')
+    print(pr['url'])
+    print(pr['url'] + '.patch')
+    print("PR submitter (%s) != committer (%s)" %
+            (pr_login, attributed['login'] if attributed else None))
+    if attributed is None:
+        attributed = pr['user']
+        print('%s (%s) -> [PR] %s (%s)' % (attributed_c['email'],
+            attributed_c['name'], attributed['login'], attributed['name']))
+    else:
+        print('%s (%s) -> %s (%s)' % (attributed_c['email'],
+            attributed_c['name'], attributed['login'], attributed['name']))
+    return attributed_c['email'], attributed['login'], True
+
+
+def main(argv):
+    argp = argparse.ArgumentParser(prog=argv[0])
+    argp.add_argument('--state', metavar='STATE_JSON',
+                      help='Store the last update time of processed PRs '
+                           'in STATE_JSON and process only PRs updated '
+                           'since then')
+    argp.add_argument('--defer', metavar='QUEUE_JSONL',
+                      help='Instead of asking for confirmation, append '
+                           'uncertain attributions to QUEUE_JSONL '
+                           'for triage-review-queue.py')
+    argp.add_argument('--full', action='store_true',
+                      help='Process all PRs, ignoring the stored update time')
+    argp.add_argument('--db', default='proxied-maints.db',
+                      help='SQLite database to store the mapping in '
+                           '(imported from proxied_maints_json if empty, '
+                           'default: proxied-maints.db)')
+    argp.add_argument('proxied_maints_json', nargs='?',
+                      default='proxied-maints.json')
+    args = argp.parse_args(argv[1:])
+    proxied_maints_json = args.proxied_maints_json
+    queue = ReviewQueue(args.defer) if args.defer is not None else None
 
     with open(os.path.expanduser('~/.github-token')) as f:
-        gh = github.Github(f.read().strip())
-
-    r = gh.get_repo('gentoo/gentoo')
-    for pr in r.get_pulls(state='all'):
-        print("\rPR #%04d" % pr.number, end='')
-        # skip special GitHub usernames
-        if pr.user.login in ("ghost", "web-flow"):
-            continue
-        if pr.user.login not in maints.values():
-            if pr.commits == 0:
+        token = f.read().strip()
+
+    # timestamps are stored as returned by GitHub (UTC, ISO 8601),
+    # so they can be compared as strings
+    watermark = None
+    if args.state is not None and not args.full:
+        try:
+            with open(args.state) as f:
+                watermark = json.load(f)['updated_at']
+        except (OSError, IOError, ValueError, KeyError):
+            pass
+    new_watermark = watermark
+
+    gql = GraphQL(token)
+    with MaintsDB(args.db) as maints:
+        if not len(maints):
+            maints.import_json(proxied_maints_json)
+
+        # newest first, so that we can stop at the first PR that was not
+        # updated since the last run
+        for pr in gql.pull_requests('gentoo', 'gentoo'):
+            updated_at = pr['updated_at']
+            if watermark is not None and updated_at < watermark:
+                break
+            if new_watermark is None or updated_at > new_watermark:
+                new_watermark = updated_at
+            print("\rPR #%04d" % pr['number'], end='')
+            # skip deleted and special GitHub users
+            if pr['user'] is None or pr['user']['login'] in ("ghost", "web-flow"):
                 continue
-            need_confirm = False
-            c1 = pr.get_commits()[0]
-            attributed = c1.committer
-            attributed_c = c1.commit.committer
-            if attributed != pr.user and c1.author == pr.user:
-                attributed = c1.author
-                attributed_c = c1.commit.author
-
-            if attributed != pr.user:
-                print('')
-                print(pr.html_url)
-                print(pr.patch_url)
-                print("PR submitter (%s) != committer (%s)" %
-                        (pr.user, c1.committer))
-                try:
-                    if c1.committer is None:
-                        attributed = pr.user
-                        print('%s (%s) -> [PR] %s (%s)' % (attributed_c.email,
-                            c1.commit.committer.name, attributed.login, attributed.name))
-                    else:
-                        attributed = c1.committer
-                        print('%s (%s) -> %s (%s)' % (attributed_c.email,
-                            c1.commit.committer.name, attributed.login, attributed.name))
-                except github.GithubException:
-                    print("Invalid committer %s" % (attributed,))
+            if not maints.has_login(pr['user']['login']):
+                attribution = attribute(pr)
+                if attribution is None:
                     continue
-                need_confirm = True
-            else:
-                print('\n%s -> %s' % (attributed_c.email, attributed.login))
-
-            if need_confirm:
-                escape = False
-                while True:
-                    resp = input('-> Proceed? [Y/n]')
-                    if resp.lower() == 'y' or not resp:
-                        break
-                    elif resp.lower() == 'n':
-                        escape = True
-                        break
-                if escape:
+                email, login, need_confirm = attribution
+
+                if need_confirm and queue is not None:
+                    c1 = pr['first_commit']
+                    queue.append({
+                        'pr': pr['number'],
+                        'url': pr['url'],
+                        'patch_url': pr['url'] + '.patch',
+                        'submitter': pr['user']['login'],
+                        'email': email,
+                        'login': login,
+                        'committer': person(c1['committer'],
+                                            c1['committer']['user']),
+                        'author': person(c1['author'], c1['author']['user']),
+                    })
+                    print('-> deferred')
                     continue
+                if need_confirm:
+                    escape = False
+                    while True:
+                        resp = input('-> Proceed? [Y/n]')
+                        if resp.lower() == 'y' or not resp:
+                            break
+                        elif resp.lower() == 'n':
+                            escape = True
+                            break
+                    if escape:
+                        continue
+
+                maints.set(email, login)
 
-            maints[attributed_c.email] = attributed.login
+        maints.export_json(proxied_maints_json)
 
-            with open(proxied_maints_json, 'w') as pm_f:
-                json.dump(maints, pm_f)
+    if args.state is not None and new_watermark is not None:
+        with open(args.state, 'w') as f:
+            json.dump({'updated_at': new_watermark}, f)
 
     print('')
     return 0
 
 
 if __name__ == '__main__':
-    sys.exit(main(*sys.argv[1:]))
+    sys.exit(main(sys.argv))
@@ -8,35 +8,31 @@ import os.path
 import sys
 
 import github
-import lxml.etree
 
+from projects import ProjectIndex
 
-def main(projects_xml='projects.xml', proj_map_json='proj-map.json'):
+
+def main(projects_index='projects-index.json', proj_map_json='proj-map.json'):
     with open(os.path.expanduser('~/.github-token')) as f:
         gh = github.Github(f.read().strip())
 
-    projs_x = lxml.etree.parse(projects_xml)
-    projs = {}
-    for p in projs_x.getroot():
-        projs[p.findtext('email').split('@')[0].lower()] = p
-        projs[p.findtext('name').split('@')[0].lower()] = p
-        projs[p.findtext('url').split(':')[2].lower()] = p
+    projs = ProjectIndex(projects_index)
 
     proj_map = {}
-    rem_projs = set(p for p in projs_x.getroot())
+    rem_projs = set(p['email'] for p in projs)
 
     gorg = gh.get_organization('gentoo')
     for t in gorg.get_teams():
-        p = projs.get(t.name.lower())
+        p = projs.lookup(t.name)
         if p is not None:
-            print('%s <-> %s' % (t.name, p))
-            proj_map[p.findtext('email').lower()] = 'gentoo/' + t.name
-            rem_projs.remove(p)
+            print('%s <-> %s' % (t.name, p['email']))
+            proj_map[p['email'].lower()] = 'gentoo/' + t.name
+            rem_projs.remove(p['email'])
         else:
             print('%s <-> ?' % (t.name,))
 
     for p in rem_projs:
-        print('MISSING PROJECT: %s' % p.findtext('email'))
+        print('MISSING PROJECT: %s' % p)
 
     with open(proj_map_json, 'w') as f:
         json.dump(proj_map, f, indent=0, sort_keys=True)
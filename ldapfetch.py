@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# Fetch active developers from LDAP into devs.ldif, incrementally
+# 2-clause BSD licensed
+
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+
+import ldap
+import ldap.filter
+from ldap.controls import SimplePagedResultsControl
+
+
+ATTRS = ('uid', 'mail', 'gentooCodebergUser', 'gentooGitHubUser')
+ACTIVE_FILTER = '(gentooStatus=active)'
+
+
+def paged_search(conn, base, filterstr, attrlist, page_size):
+    """
+    Search using the paged results control, yielding (dn, attrs)
+    """
+    ctrl = SimplePagedResultsControl(True, size=page_size, cookie='')
+    while True:
+        msgid = conn.search_ext(base, ldap.SCOPE_SUBTREE, filterstr,
+                                attrlist, serverctrls=[ctrl])
+        rtype, rdata, rmsgid, serverctrls = conn.result3(msgid)
+        for dn, attrs in rdata:
+            # skip search references
+            if dn is not None:
+                yield dn, attrs
+
+        pctrls = [c for c in serverctrls
+                  if c.controlType == SimplePagedResultsControl.controlType]
+        if not pctrls or not pctrls[0].cookie:
+            break
+        ctrl.cookie = pctrls[0].cookie
+
+
+def ldif_line(k, v):
+    # values that are not "safe strings" per RFC 2849 need base64
+    if (not v or v[0] in ' :<' or v[-1] == ' '
+            or any(ord(c) < 32 or ord(c) > 126 for c in v)):
+        return '%s:: %s\n' % (k, base64.b64encode(v.encode()).decode())
+    return '%s: %s\n' % (k, v)
+
+
+def write_ldif(f, entries):
+    for dn in sorted(entries):
+        f.write(ldif_line('dn', dn))
+        for k in ATTRS:
+            for v in entries[dn].get(k, []):
+                f.write(ldif_line(k, v))
+        f.write('\n')
+
+
+def write_atomic(path, write):
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def sync(conn, base, cache, page_size):
+    """
+    Update cache with entries modified since the last sync, and drop
+    entries that are no longer active
+
+    cache is a dict with 'entries' (dn -> attribute -> list of values)
+    and 'last_sync' (the newest modifyTimestamp seen, or None to fetch
+    all entries).
+    """
+    entries = cache['entries']
+    last_sync = cache['last_sync']
+
+    filterstr = ACTIVE_FILTER
+    if last_sync is not None:
+        filterstr = ('(&%s(modifyTimestamp>=%s))'
+                     % (ACTIVE_FILTER, ldap.filter.escape_filter_chars(last_sync)))
+
+    updated = 0
+    for dn, attrs in paged_search(conn, base, filterstr,
+                                  list(ATTRS) + ['modifyTimestamp'],
+                                  page_size):
+        attrs = dict((k, [v.decode() for v in vs]) for k, vs in attrs.items())
+        for ts in attrs.pop('modifyTimestamp', []):
+            # GeneralizedTime in UTC sorts correctly as a string
+            if last_sync is None or ts > last_sync:
+                last_sync = ts
+        entries[dn] = attrs
+        updated += 1
+
+    # tombstones: entries that were deactivated or removed no longer
+    # match the filter, so list DNs of all active entries (without
+    # attributes, which is cheap) and drop the rest
+    removed = 0
+    if cache['last_sync'] is not None:
+        active = set(dn for dn, attrs
+                     in paged_search(conn, base, ACTIVE_FILTER, ['1.1'],
+                                     page_size))
+        for dn in list(entries):
+            if dn not in active:
+                del entries[dn]
+                removed += 1
+
+    cache['last_sync'] = last_sync
+    return updated, removed
+
+
+def main(argv):
+    argp = argparse.ArgumentParser(prog=argv[0])
+    argp.add_argument('--uri', default=os.environ.get('LDAP_URI'),
+                      required='LDAP_URI' not in os.environ,
+                      help='LDAP server URI (default: $LDAP_URI)')
+    argp.add_argument('--base', default='ou=devs,dc=gentoo,dc=org',
+                      help='Search base (default: ou=devs,dc=gentoo,dc=org)')
+    argp.add_argument('-Z', '--starttls', action='store_true',
+                      help='Use StartTLS')
+    argp.add_argument('--cache', default='devs-cache.json',
+                      help='Local cache of entries (default: devs-cache.json)')
+    argp.add_argument('--full', action='store_true',
+                      help='Fetch all entries, ignoring the cache')
+    argp.add_argument('--page-size', type=int, default=500,
+                      help='Number of entries per page (default: 500)')
+    argp.add_argument('output', nargs='?', default='devs.ldif')
+    args = argp.parse_args(argv[1:])
+
+    cache = {'last_sync': None, 'entries': {}}
+    if not args.full:
+        try:
+            with open(args.cache) as f:
+                cache = json.load(f)
+        except (OSError, IOError, ValueError):
+            pass
+
+    conn = ldap.initialize(args.uri)
+    conn.protocol_version = ldap.VERSION3
+    # paged results do not work with referrals
+    conn.set_option(ldap.OPT_REFERRALS, 0)
+    if args.starttls:
+        conn.start_tls_s()
+    conn.simple_bind_s()
+    try:
+        updated, removed = sync(conn, args.base, cache, args.page_size)
+    finally:
+        conn.unbind_s()
+    print('%d entries updated, %d removed, %d total'
+          % (updated, removed, len(cache['entries'])))
+
+    # write the output first, so that the cache is never newer
+    write_atomic(args.output, lambda f: write_ldif(f, cache['entries']))
+    write_atomic(args.cache, lambda f: json.dump(cache, f))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
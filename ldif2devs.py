@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# Compile LDIF dump of developers into forge login maps
+# 2-clause BSD licensed
+
+import argparse
+import base64
+import hashlib
+import json
+import sys
+
+
+def parse_line(line):
+    """
+    Split LDIF line into (attribute, value)
+    """
+    k, v = line.split(':', 1)
+    if v.startswith(':'):
+        # base64
+        v = base64.b64decode(v[1:].strip()).decode()
+    elif v.startswith('<'):
+        raise ValueError('URL values are not supported: %s' % line)
+    else:
+        v = v.strip()
+    return k, v
+
+
+def read_ldif(f):
+    """
+    Stream entries from LDIF file f, as lists of (attribute, value)
+
+    Folded lines are unfolded, and comments are skipped.
+    """
+    entry = []
+    line = None
+    comment = False
+
+    for l in f:
+        l = l.rstrip('\r\n')
+        if l.startswith(' '):
+            # continuation of the previous line
+            if not comment:
+                line += l[1:]
+            continue
+        if line is not None:
+            entry.append(parse_line(line))
+            line = None
+        comment = l.startswith('#')
+        if comment:
+            continue
+        if not l:
+            if entry:
+                yield entry
+                entry = []
+        else:
+            line = l
+
+    if line is not None:
+        entry.append(parse_line(line))
+    if entry:
+        yield entry
+
+
+def entry_hash(entry):
+    return hashlib.sha256(
+        json.dumps(sorted(entry)).encode()).hexdigest()
+
+
+def main(argv):
+    argp = argparse.ArgumentParser(prog=argv[0])
+    argp.add_argument('-i', '--index', metavar='INDEX_JSON',
+                      help='Also write reverse login -> e-mails maps and '
+                           'per-entry hashes to INDEX_JSON')
+    argp.add_argument('ldif', help='LDIF file to read (e.g. devs.ldif)')
+    argp.add_argument('maps', nargs='+', metavar='ATTR=OUT',
+                      help='Write e-mail -> value of ATTR map to OUT '
+                           '(e.g. gentooGitHubUser=github/devs.json)')
+    args = argp.parse_args(argv[1:])
+
+    outputs = []
+    for m in args.maps:
+        attr, sep, path = m.partition('=')
+        if not sep:
+            argp.error('invalid map specification: %s' % m)
+        outputs.append((attr, path, {}))
+
+    entries = {}
+    with open(args.ldif) as f:
+        for entry in read_ldif(f):
+            # skip the LDIF version line
+            if entry[0][0].lower() == 'version':
+                entry = entry[1:]
+                if not entry:
+                    continue
+
+            dn = None
+            mails = set()
+            values = {}
+            for k, v in entry:
+                k = k.lower()
+                if k == 'dn':
+                    dn = v
+                elif k == 'uid':
+                    mails.add(v + '@gentoo.org')
+                elif k == 'mail':
+                    assert '@' in v
+                    mails.add(v)
+                values[k] = v
+            assert mails
+
+            for attr, path, devs in outputs:
+                for m in mails:
+                    devs[m] = values.get(attr.lower(), '')
+            if args.index is not None:
+                entries[dn] = {
+                    'hash': entry_hash(entry),
+                    'emails': sorted(mails),
+                }
+
+    for attr, path, devs in outputs:
+        with open(path, 'w') as devs_f:
+            json.dump(devs, devs_f, indent=0, sort_keys=True)
+
+    if args.index is not None:
+        logins = {}
+        for attr, path, devs in outputs:
+            rev = logins.setdefault(attr, {})
+            for m, login in devs.items():
+                if login:
+                    rev.setdefault(login, []).append(m)
+            for v in rev.values():
+                v.sort()
+        with open(args.index, 'w') as f:
+            json.dump({
+                'entries': entries,
+                'logins': logins,
+            }, f, sort_keys=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# Compile projects.xml into a JSON index used by forge scripts
+# 2-clause BSD licensed
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import lxml.etree
+
+
+def aliases(email, name, url):
+    """
+    Get all (normalized) names a forge team for the project may use
+    """
+    ret = []
+    for x in (email.split('@')[0], name, url.split(':')[2]):
+        for a in (x.lower(), x.replace(' ', '-').lower()):
+            if a not in ret:
+                ret.append(a)
+    return ret
+
+
+def read_projects(projects_xml):
+    """
+    Stream per-project records from projects_xml
+
+    Every <project/> element is converted into a plain dict and cleared
+    as soon as it is parsed, so memory use does not depend on the size
+    of the file.
+    """
+    for ev, p in lxml.etree.iterparse(projects_xml, events=('end',),
+                                      tag='project'):
+        email = p.findtext('email')
+        name = p.findtext('name')
+        url = p.findtext('url')
+        yield {
+            'email': email,
+            'name': name,
+            'url': url,
+            'description': p.findtext('description'),
+            'aliases': aliases(email, name, url),
+            'members': [{
+                'email': m.findtext('email'),
+                'name': m.findtext('name'),
+                'role': m.findtext('role'),
+                'is_lead': m.get('is-lead', '0') == '1',
+            } for m in p.findall('member')],
+            'subprojects': [{
+                'ref': sp.get('ref'),
+                'inherit_members': sp.get('inherit-members', '0') == '1',
+            } for sp in p.findall('subproject')],
+        }
+
+        # free the element and the references the root keeps
+        # to already processed siblings
+        p.clear()
+        while p.getprevious() is not None:
+            del p.getparent()[0]
+
+
+def resolve_members(projects):
+    """
+    Set 'all_members' of every project to lowercase e-mails of its
+    members, including members of subprojects with inherit-members,
+    without duplicates
+
+    Projects inheriting members from one another in a cycle all get
+    the union of members of the whole cycle.
+    """
+
+    def inherited(email):
+        return [sp['ref'] for sp in projects[email]['subprojects']
+                if sp['inherit_members'] and sp['ref'] in projects]
+
+    # Tarjan's algorithm: every strongly connected component is
+    # completed only after all components reachable from it
+    order = dict((email, i) for i, email in enumerate(projects))
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+
+    def resolve_component(component):
+        component.sort(key=order.get)
+        if len(component) > 1 or component[0] in inherited(component[0]):
+            cycle = component + [component[0]]
+            print('WARN: subproject cycle: %s' % ' -> '.join(cycle))
+
+        # use a dict to preserve order
+        members = {}
+        for email in component:
+            members.update(dict.fromkeys(
+                m['email'].lower() for m in projects[email]['members']))
+        for email in component:
+            for ref in inherited(email):
+                if ref not in component:
+                    members.update(dict.fromkeys(projects[ref]['all_members']))
+
+        for email in component:
+            projects[email]['all_members'] = list(members)
+
+    def visit(email):
+        index[email] = low[email] = len(index)
+        stack.append(email)
+        on_stack.add(email)
+        for ref in inherited(email):
+            if ref not in index:
+                visit(ref)
+                low[email] = min(low[email], low[ref])
+            elif ref in on_stack:
+                low[email] = min(low[email], index[ref])
+
+        if low[email] == index[email]:
+            component = []
+            while True:
+                ref = stack.pop()
+                on_stack.discard(ref)
+                component.append(ref)
+                if ref == email:
+                    break
+            resolve_component(component)
+
+    for email in projects:
+        if email not in index:
+            visit(email)
+
+
+def sources_hash(paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                h.update(block)
+    return h.hexdigest()
+
+
+def main(argv):
+    argp = argparse.ArgumentParser(prog=argv[0])
+    argp.add_argument('-o', '--output', default='projects-index.json',
+                      help='Index file to write (default: '
+                           'projects-index.json)')
+    argp.add_argument('projects_xml', nargs='*', default=['projects.xml'],
+                      help='projects.xml-style feeds to merge (later '
+                           'files override projects from earlier ones)')
+    args = argp.parse_args(argv[1:])
+    index_json = args.output
+
+    # include this script, so that changes to it rebuild the index
+    source_hash = sources_hash([os.path.abspath(__file__)]
+                               + args.projects_xml)
+
+    # skip rebuilding if the sources were refetched without changes
+    try:
+        with open(index_json) as f:
+            if json.load(f)['source_sha256'] == source_hash:
+                os.utime(index_json)
+                return 0
+    except (OSError, IOError, ValueError, KeyError):
+        pass
+
+    projects = {}
+    for projects_xml in args.projects_xml:
+        for p in read_projects(projects_xml):
+            projects[p['email']] = p
+    resolve_members(projects)
+
+    alias_map = {}
+    member_projects = {}
+    for p in projects.values():
+        for a in p['aliases']:
+            alias_map[a] = p['email']
+        for m in p['all_members']:
+            member_projects.setdefault(m, []).append(p['email'])
+
+    with open(index_json, 'w') as f:
+        json.dump({
+            'source_sha256': source_hash,
+            'projects': projects,
+            'aliases': alias_map,
+            'member_projects': member_projects,
+        }, f, sort_keys=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,100 @@
+import os.path
+import sys
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "codeberg"))
+
+from scheduler import RequestScheduler, parse_retry_after
+
+
+class FakeSession:
+    """
+    Session returning (or raising) the queued results in order
+    """
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        r = requests.Response()
+        r.status_code = result
+        r.url = url
+        return r
+
+
+def scheduler(**kwargs):
+    return RequestScheduler(max_concurrency=2, backoff_base=0, **kwargs)
+
+
+def test_retry_transient_error():
+    s = scheduler()
+    session = FakeSession(502, requests.ConnectionError(), 200)
+    retries = []
+    r = s.request(session, "get", "https://example.com/", lambda: retries.append(1))
+    assert r.status_code == 200
+    assert len(session.requests) == 3
+    assert len(retries) == 2
+    assert s._in_flight == 0
+
+
+def test_no_retry_non_idempotent():
+    s = scheduler()
+    session = FakeSession(502, 200)
+    with pytest.raises(requests.HTTPError):
+        s.request(session, "POST", "https://example.com/")
+    assert len(session.requests) == 1
+
+    session = FakeSession(requests.ConnectionError(), 200)
+    with pytest.raises(requests.ConnectionError):
+        s.request(session, "POST", "https://example.com/")
+    assert len(session.requests) == 1
+
+
+def test_retry_too_many_requests_non_idempotent():
+    s = scheduler()
+    session = FakeSession(429, 201)
+    assert s.request(session, "POST", "https://example.com/").status_code == 201
+
+
+def test_max_retries():
+    s = scheduler(max_retries=2)
+    session = FakeSession(503, 503, 503, 200)
+    with pytest.raises(requests.HTTPError):
+        s.request(session, "GET", "https://example.com/")
+    assert len(session.requests) == 3
+    assert s._in_flight == 0
+
+
+def test_release_on_other_errors():
+    # errors that are not retried must not leak concurrency slots
+    s = scheduler()
+    session = FakeSession(
+        requests.exceptions.ChunkedEncodingError(),
+        requests.exceptions.ChunkedEncodingError(),
+        200,
+    )
+    for i in range(2):
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            s.request(session, "GET", "https://example.com/")
+    assert s._in_flight == 0
+    assert s.request(session, "GET", "https://example.com/").status_code == 200
+
+
+def test_throttle_halves_concurrency():
+    s = RequestScheduler(max_concurrency=8, backoff_base=0)
+    s.request(FakeSession(429, 200), "GET", "https://example.com/")
+    assert s._limit < 8
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
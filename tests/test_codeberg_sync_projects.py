@@ -0,0 +1,104 @@
+import argparse
+import importlib.util
+import json
+import os.path
+import sys
+
+import requests
+
+CODEBERG = os.path.join(os.path.dirname(os.path.dirname(__file__)), "codeberg")
+sys.path.insert(0, CODEBERG)
+
+spec = importlib.util.spec_from_file_location(
+    "sync_projects", os.path.join(CODEBERG, "sync-projects.py")
+)
+sync_projects = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sync_projects)
+
+
+class FakeAPI:
+    def __init__(self, teams):
+        # team name -> member logins, or exception raised when reading
+        self._teams = teams
+
+    def teams(self, org):
+        for i, name in enumerate(self._teams):
+            yield {"id": i + 1, "name": name}
+
+    def team_members(self, team_id):
+        members = list(self._teams.values())[team_id - 1]
+        if isinstance(members, Exception):
+            raise members
+        return [{"login": m} for m in members]
+
+    def team_repo_count(self, team_id):
+        return 0
+
+
+def project(name, members):
+    return {
+        "email": f"{name}@gentoo.org",
+        "name": name,
+        "url": f"https://wiki.gentoo.org/wiki/Project:{name}",
+        "description": f"{name} project",
+        "subprojects": [],
+        "all_members": members,
+    }
+
+
+def make_plan(tmp_path, cb, fingerprints):
+    devs = tmp_path / "devs.json"
+    devs.write_text(json.dumps({"alice@gentoo.org": "alice", "bob@gentoo.org": "bob"}))
+    index = tmp_path / "projects-index.json"
+    projects = [
+        project("base", ["alice@gentoo.org", "bob@gentoo.org"]),
+        project("python", ["bob@gentoo.org"]),
+    ]
+    index.write_text(
+        json.dumps(
+            {
+                "projects": {p["email"]: p for p in projects},
+                "aliases": {p["name"]: p["email"] for p in projects},
+                "member_projects": {},
+            }
+        )
+    )
+    args = argparse.Namespace(
+        devs_json=str(devs),
+        projects_index=str(index),
+        full=True,
+        sample=0.0,
+        jobs=2,
+    )
+    return sync_projects.make_plan(cb, args, fingerprints)
+
+
+def test_make_plan(tmp_path):
+    fingerprints = {}
+    plan, failed = make_plan(
+        tmp_path, FakeAPI({"base": ["alice"], "python": ["alice"]}), fingerprints
+    )
+    assert failed == 0
+    assert [(a["op"], a["team"], a["user"]) for a in plan.actions] == [
+        ("add", "base", "bob"),
+        ("remove", "python", "alice"),
+        ("add", "python", "bob"),
+    ]
+    assert sorted(fingerprints) == ["1", "2"]
+
+
+def test_make_plan_read_failure(tmp_path, capsys):
+    fingerprints = {"1": "old", "2": "old"}
+    plan, failed = make_plan(
+        tmp_path,
+        FakeAPI({"base": requests.ConnectionError("boom"), "python": ["alice"]}),
+        fingerprints,
+    )
+    assert failed == 1
+    assert [(a["op"], a["team"], a["user"]) for a in plan.actions] == [
+        ("remove", "python", "alice"),
+        ("add", "python", "bob"),
+    ]
+    # the failed team is synced again next time
+    assert list(fingerprints) == ["2"]
+    assert "ERROR: reading team base failed" in capsys.readouterr().out
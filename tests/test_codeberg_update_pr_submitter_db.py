@@ -0,0 +1,76 @@
+import importlib.util
+import os.path
+import sys
+import threading
+
+CODEBERG = os.path.join(os.path.dirname(os.path.dirname(__file__)), "codeberg")
+sys.path.insert(0, CODEBERG)
+
+spec = importlib.util.spec_from_file_location(
+    "update_pr_submitter_db", os.path.join(CODEBERG, "update-pr-submitter-db.py")
+)
+update_pr_submitter_db = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(update_pr_submitter_db)
+
+
+class FakeAPI:
+    def __init__(self, commits):
+        self.commits = commits
+        self.fetched = []
+        self._lock = threading.Lock()
+
+    def first_commit(self, pr_id):
+        with self._lock:
+            self.fetched.append(pr_id)
+        return self.commits.get(pr_id)
+
+
+def pr(number, login):
+    return {"number": number, "user": {"login": login}}
+
+
+def prefetch(cb, prs, known, window=2):
+    """
+    Run prefetch_first_commits(), recording submitters as known when
+    their PR is consumed (like the main loop does)
+    """
+    for p, c1 in update_pr_submitter_db.prefetch_first_commits(
+        cb, prs, known.__contains__, window
+    ):
+        yield p["number"], c1
+        if c1 is not None:
+            known.add(p["user"]["login"])
+
+
+def test_prefetch_first_commits():
+    cb = FakeAPI({1: {"sha": "a"}, 3: {"sha": "c"}})
+    prs = [pr(1, "alice"), pr(2, "bob"), pr(3, "carol")]
+    assert list(prefetch(cb, prs, {"bob"})) == [
+        (1, {"sha": "a"}),
+        (2, None),
+        (3, {"sha": "c"}),
+    ]
+    assert sorted(cb.fetched) == [1, 3]
+
+
+def test_prefetch_first_commits_no_commits():
+    cb = FakeAPI({})
+    assert list(prefetch(cb, [pr(1, "alice")], set())) == [(1, None)]
+
+
+def test_prefetch_first_commits_on_demand():
+    # bob is known when PR 2 is prefetched, but forgotten (e.g. the
+    # mapping was replaced) by the time PR 2 is processed
+    known = {"bob"}
+    cb = FakeAPI({1: {"sha": "a"}, 2: {"sha": "b"}})
+
+    def prs():
+        yield pr(1, "alice")
+        yield pr(2, "bob")
+        known.discard("bob")
+
+    assert list(prefetch(cb, prs(), known, window=8)) == [
+        (1, {"sha": "a"}),
+        (2, {"sha": "b"}),
+    ]
+    assert sorted(cb.fetched) == [1, 2]
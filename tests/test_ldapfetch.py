@@ -0,0 +1,151 @@
+import re
+
+import pytest
+
+ldap = pytest.importorskip('ldap')
+from ldap.controls import SimplePagedResultsControl
+
+import ldapfetch
+import ldif2devs
+
+
+class FakeLDAP(object):
+    """
+    Stand-in for an LDAP connection, supporting paged searches for
+    the filters used by ldapfetch
+    """
+
+    def __init__(self, entries):
+        # dn -> attribute -> list of values (str)
+        self.entries = entries
+        self.searches = []
+        self._results = {}
+
+    def search_ext(self, base, scope, filterstr, attrlist, serverctrls):
+        assert scope == ldap.SCOPE_SUBTREE
+        m = re.search(r'\(modifyTimestamp>=([^)]*)\)', filterstr)
+        since = m.group(1) if m is not None else None
+        self.searches.append((filterstr, attrlist))
+
+        ctrl, = serverctrls
+        offset = int(ctrl.cookie or 0)
+        matched = []
+        for dn in sorted(self.entries):
+            attrs = self.entries[dn]
+            if attrs['gentooStatus'] != ['active']:
+                continue
+            if since is not None and attrs['modifyTimestamp'][0] < since:
+                continue
+            matched.append(
+                (dn, dict((k, [v.encode() for v in vs])
+                          for k, vs in attrs.items() if k in attrlist)))
+
+        page = matched[offset:offset + ctrl.size]
+        offset += ctrl.size
+        cookie = b'%d' % offset if offset < len(matched) else b''
+        msgid = len(self.searches)
+        self._results[msgid] = (page, cookie, ctrl.size)
+        return msgid
+
+    def result3(self, msgid):
+        page, cookie, size = self._results.pop(msgid)
+        ctrl = SimplePagedResultsControl(True, size=size, cookie=cookie)
+        return ldap.RES_SEARCH_RESULT, page, msgid, [ctrl]
+
+
+def dev(uid, ts, status='active', **attrs):
+    entry = {
+        'uid': [uid],
+        'mail': ['%s@example.com' % uid],
+        'gentooStatus': [status],
+        'modifyTimestamp': [ts],
+    }
+    entry.update((k, [v]) for k, v in attrs.items())
+    return 'uid=%s,ou=devs,dc=gentoo,dc=org' % uid, entry
+
+
+def fake_ldap(*devs):
+    return FakeLDAP(dict(devs))
+
+
+def test_full_sync_paging():
+    conn = fake_ldap(
+        dev('alice', '20240101000000Z', gentooGitHubUser='alice-gh'),
+        dev('bob', '20240301000000Z'),
+        dev('carol', '20240201000000Z'),
+        dev('dave', '20240401000000Z', status='retired'),
+        dev('eve', '20240102000000Z'),
+    )
+    cache = {'last_sync': None, 'entries': {}}
+    assert ldapfetch.sync(conn, 'dc=gentoo,dc=org', cache, 2) == (4, 0)
+
+    # 4 active entries in pages of 2, no tombstone search on full sync
+    assert len(conn.searches) == 2
+    assert all(f == ldapfetch.ACTIVE_FILTER for f, attrs in conn.searches)
+    assert cache['last_sync'] == '20240301000000Z'
+    assert sorted(cache['entries']) == [
+        'uid=alice,ou=devs,dc=gentoo,dc=org',
+        'uid=bob,ou=devs,dc=gentoo,dc=org',
+        'uid=carol,ou=devs,dc=gentoo,dc=org',
+        'uid=eve,ou=devs,dc=gentoo,dc=org',
+    ]
+    assert cache['entries']['uid=alice,ou=devs,dc=gentoo,dc=org'] == {
+        'uid': ['alice'],
+        'mail': ['alice@example.com'],
+        'gentooGitHubUser': ['alice-gh'],
+    }
+
+
+def test_incremental_sync():
+    conn = fake_ldap(
+        dev('alice', '20240101000000Z'),
+        dev('bob', '20240301000000Z'),
+        dev('carol', '20240201000000Z'),
+        dev('eve', '20240102000000Z'),
+    )
+    cache = {'last_sync': None, 'entries': {}}
+    ldapfetch.sync(conn, 'dc=gentoo,dc=org', cache, 2)
+
+    # alice changes her mail, carol retires and eve is removed
+    conn.entries.update([
+        dev('alice', '20240501000000Z', mail='alice@gentoo.org'),
+        dev('carol', '20240502000000Z', status='retired'),
+    ])
+    del conn.entries['uid=eve,ou=devs,dc=gentoo,dc=org']
+    conn.searches = []
+
+    # bob is fetched again since his modifyTimestamp equals last_sync
+    assert ldapfetch.sync(conn, 'dc=gentoo,dc=org', cache, 2) == (2, 2)
+    (filterstr, attrs), (tomb_filter, tomb_attrs) = conn.searches
+    assert filterstr == ('(&%s(modifyTimestamp>=20240301000000Z))'
+                         % ldapfetch.ACTIVE_FILTER)
+    assert tomb_filter == ldapfetch.ACTIVE_FILTER
+    assert tomb_attrs == ['1.1']
+
+    assert cache['last_sync'] == '20240501000000Z'
+    assert sorted(cache['entries']) == [
+        'uid=alice,ou=devs,dc=gentoo,dc=org',
+        'uid=bob,ou=devs,dc=gentoo,dc=org',
+    ]
+    assert (cache['entries']['uid=alice,ou=devs,dc=gentoo,dc=org']['mail']
+            == ['alice@gentoo.org'])
+
+
+def test_write_ldif(tmp_path):
+    path = tmp_path / 'devs.ldif'
+    entries = {
+        'uid=alice,ou=devs,dc=gentoo,dc=org': {
+            'uid': ['alice'],
+            'mail': ['alice@example.com'],
+            'gentooGitHubUser': [' alice'],
+        },
+    }
+    ldapfetch.write_atomic(str(path),
+                           lambda f: ldapfetch.write_ldif(f, entries))
+    with open(str(path)) as f:
+        assert list(ldif2devs.read_ldif(f)) == [[
+            ('dn', 'uid=alice,ou=devs,dc=gentoo,dc=org'),
+            ('uid', 'alice'),
+            ('mail', 'alice@example.com'),
+            ('gentooGitHubUser', ' alice'),
+        ]]
@@ -0,0 +1,85 @@
+import base64
+import io
+import json
+
+import ldif2devs
+
+
+LDIF = '''version: 1
+
+# alice, devs, gentoo.org
+dn: uid=alice,ou=devs,dc=gentoo,dc=org
+uid: alice
+mail: alice@example.com
+gentooGitHubUser: alice-gh 
+gentooCodebergUser: alice-cb
+
+# a folded comment
+ that continues here
+dn: uid=bob,ou=devs,dc=gen
+ too,dc=org
+uid: bob
+gentooGitHubUser:: %s
+''' % base64.b64encode(' bob-gh'.encode()).decode()
+
+
+def test_parse_line():
+    assert ldif2devs.parse_line('uid: alice') == ('uid', 'alice')
+    assert ldif2devs.parse_line('uid:alice  ') == ('uid', 'alice')
+    assert ldif2devs.parse_line('cn:: w6lsaXNl') == ('cn', '\xe9lise')
+
+
+def test_read_ldif():
+    assert list(ldif2devs.read_ldif(io.StringIO(LDIF))) == [
+        [('version', '1')],
+        [
+            ('dn', 'uid=alice,ou=devs,dc=gentoo,dc=org'),
+            ('uid', 'alice'),
+            ('mail', 'alice@example.com'),
+            ('gentooGitHubUser', 'alice-gh'),
+            ('gentooCodebergUser', 'alice-cb'),
+        ],
+        [
+            ('dn', 'uid=bob,ou=devs,dc=gentoo,dc=org'),
+            ('uid', 'bob'),
+            ('gentooGitHubUser', ' bob-gh'),
+        ],
+    ]
+
+
+def test_main(tmp_path):
+    ldif = tmp_path / 'devs.ldif'
+    ldif.write_text(LDIF)
+    github = tmp_path / 'github.json'
+    codeberg = tmp_path / 'codeberg.json'
+    index = tmp_path / 'devs-index.json'
+    assert ldif2devs.main([
+        'ldif2devs.py', '-i', str(index), str(ldif),
+        'gentooGitHubUser=%s' % github,
+        'gentooCodebergUser=%s' % codeberg,
+    ]) == 0
+
+    assert json.loads(github.read_text()) == {
+        'alice@example.com': 'alice-gh',
+        'alice@gentoo.org': 'alice-gh',
+        'bob@gentoo.org': ' bob-gh',
+    }
+    assert json.loads(codeberg.read_text()) == {
+        'alice@example.com': 'alice-cb',
+        'alice@gentoo.org': 'alice-cb',
+        'bob@gentoo.org': '',
+    }
+    data = json.loads(index.read_text())
+    assert data['logins'] == {
+        'gentooCodebergUser': {
+            'alice-cb': ['alice@example.com', 'alice@gentoo.org'],
+        },
+        'gentooGitHubUser': {
+            ' bob-gh': ['bob@gentoo.org'],
+            'alice-gh': ['alice@example.com', 'alice@gentoo.org'],
+        },
+    }
+    assert sorted(data['entries']) == [
+        'uid=alice,ou=devs,dc=gentoo,dc=org',
+        'uid=bob,ou=devs,dc=gentoo,dc=org',
+    ]
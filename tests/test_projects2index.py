@@ -0,0 +1,91 @@
+import json
+
+import projects2index
+
+
+def project(email, members, inherits=()):
+    return {
+        'email': email,
+        'members': [{'email': m} for m in members],
+        'subprojects': [{'ref': ref, 'inherit_members': True}
+                        for ref in inherits],
+    }
+
+
+def resolve(*projects):
+    projects = dict((p['email'], p) for p in projects)
+    projects2index.resolve_members(projects)
+    return dict((email, p['all_members']) for email, p in projects.items())
+
+
+def test_inherited_members():
+    assert resolve(
+        project('a@gentoo.org', ['Alice@gentoo.org'], ['b@gentoo.org']),
+        project('b@gentoo.org', ['bob@gentoo.org', 'alice@gentoo.org']),
+    ) == {
+        'a@gentoo.org': ['alice@gentoo.org', 'bob@gentoo.org'],
+        'b@gentoo.org': ['bob@gentoo.org', 'alice@gentoo.org'],
+    }
+
+
+def test_cycle():
+    for order in ((0, 1), (1, 0)):
+        projects = [
+            project('a@gentoo.org', ['alice@gentoo.org'], ['b@gentoo.org']),
+            project('b@gentoo.org', ['bob@gentoo.org'], ['a@gentoo.org']),
+        ]
+        members = resolve(*(projects[i] for i in order))
+        assert dict((k, sorted(v)) for k, v in members.items()) == {
+            'a@gentoo.org': ['alice@gentoo.org', 'bob@gentoo.org'],
+            'b@gentoo.org': ['alice@gentoo.org', 'bob@gentoo.org'],
+        }
+
+
+def test_inherit_from_cycle():
+    members = resolve(
+        project('top@gentoo.org', ['tom@gentoo.org'], ['a@gentoo.org']),
+        project('a@gentoo.org', ['alice@gentoo.org'], ['b@gentoo.org']),
+        project('b@gentoo.org', ['bob@gentoo.org'], ['a@gentoo.org']),
+    )
+    assert sorted(members['top@gentoo.org']) == [
+        'alice@gentoo.org', 'bob@gentoo.org', 'tom@gentoo.org']
+    assert sorted(members['b@gentoo.org']) == [
+        'alice@gentoo.org', 'bob@gentoo.org']
+
+
+PROJECTS_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<projects>
+<project>
+  <email>a@gentoo.org</email>
+  <name>A</name>
+  <url>https://wiki.gentoo.org/wiki/Project:A</url>
+  <description>A project</description>
+  <member><email>alice@gentoo.org</email></member>
+</project>
+</projects>
+'''
+
+
+def test_skip_rebuild(tmp_path):
+    xml = tmp_path / 'projects.xml'
+    xml.write_text(PROJECTS_XML)
+    index = tmp_path / 'projects-index.json'
+    argv = ['projects2index.py', '-o', str(index), str(xml)]
+    assert projects2index.main(argv) == 0
+    data = json.loads(index.read_text())
+    assert data['member_projects'] == {'alice@gentoo.org': ['a@gentoo.org']}
+
+    # unchanged sources are not processed again
+    data['member_projects'] = {}
+    index.write_text(json.dumps(data))
+    assert projects2index.main(argv) == 0
+    assert json.loads(index.read_text())['member_projects'] == {}
+
+    # an index built by a different version of the script is rebuilt,
+    # even though projects.xml did not change
+    data['source_sha256'] = projects2index.sources_hash([str(xml)])
+    index.write_text(json.dumps(data))
+    assert projects2index.main(argv) == 0
+    assert json.loads(index.read_text())['member_projects'] == {
+        'alice@gentoo.org': ['a@gentoo.org'],
+    }